@@ -0,0 +1,299 @@
+import argparse
+import functools
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import folium
+import geopandas as gpd
+import imageio.v3 as iio
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.coords import BoundingBox
+from rasterio.transform import from_bounds
+from shapely.geometry import Point
+
+from map_assets import add_plugins
+from map_layers import add_point_layer, render_map
+from nearest_stations import NearestStations
+from observations import VARIABLE_LABELS, WIDE_COLUMNS, ObservationStore, to_long_table
+from raster_access import Raster
+from raster_difference import difference_from_rasters
+from raster_overlay import encode_overlay
+from raster_sampling import sample_raster
+from spatial_query import StationIndex, attribute_mask
+from station_charts import chart_data
+from station_maps import build_days_map, build_map
+from timelapse import FORMATS, render_frame
+
+# Banc d'essai des chemins critiques des pages, sur des données synthétiques.
+# python benchmarks.py --save-baseline enregistre la référence ; les exécutions
+# suivantes échouent (code 1) si un cas dépasse la référence de plus de --tolerance,
+# ou s'il n'a pas de référence. Les temps dépendent de la machine : la référence
+# n'est pas versionnée, chaque machine (poste, CI) enregistre la sienne.
+BASELINE_PATH = "benchmarks_baseline.json"
+STATION_SIZES = (1_000, 10_000, 100_000)
+RASTER_SIZES = (256, 1024, 2048)
+MOROCCO_BOUNDS = BoundingBox(-17.0, 21.0, -1.0, 36.0)
+REGIONS = ["TANGER-TETOUAN-AL HOCEIMA", "ORIENTAL-RIF", "FES-MEKNES", "RABAT-SALE-KENITRA", "BENI MELLAL-KHENIFRA",
+           "CASABLANCA-SETTAT", "MARRAKECH-SAFI", "DRAA-TAFILALET", "SOUSS-MASSA", "GUELMIM-OUED NOUN",
+           "LAAYOUNE-BOUJDOUR-SAKIA AL HAMRA", "ED DAKHLA-OUED EDDAHAB"]
+VALUE_RANGES = {"prec": 100, "temp": 20, "hum": 50}
+
+
+def synthetic_stations(n, seed=0):
+    """
+    GeoDataFrame de n stations avec les colonnes du Parquet des stations.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {
+        "FID_1": np.arange(n),
+        "Nom_Region": pd.Categorical(rng.choice(REGIONS, n)),
+        "TEMPMOY": rng.uniform(5, 30, n),
+        "HUMIDITEMO": rng.uniform(10, 60, n),
+        "DATE": pd.Timestamp("2023-11-22").date(),
+    }
+    for variable, wide in WIDE_COLUMNS.items():
+        for column in wide:
+            columns[column] = rng.integers(0, VALUE_RANGES[variable] + 1, n).astype(np.int16)
+    geometry = gpd.points_from_xy(rng.uniform(MOROCCO_BOUNDS.left, MOROCCO_BOUNDS.right, n),
+                                  rng.uniform(MOROCCO_BOUNDS.bottom, MOROCCO_BOUNDS.top, n), crs="EPSG:4326")
+    return gpd.GeoDataFrame(columns, geometry=geometry)
+
+
+def synthetic_data(n, seed=0):
+    """
+    Stations synthétiques et leur magasin d'observations, comme les lisent les pages.
+    """
+    gdf = synthetic_stations(n, seed)
+    return gdf, ObservationStore(to_long_table(gdf))
+
+
+def synthetic_raster(size, seed=0, nodata=-3.4028230607370965e+38):
+    """
+    Raster size x size sur l'emprise du Maroc : champ lisse de 0 à 100 (proche des
+    rasters interpolés, pour que la compression PNG/GIF soit représentative),
+    léger bruit et 10 % de pixels nodata.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:1:size * 1j, 0:1:size * 1j]
+    phase = rng.uniform(0, 2 * np.pi, 2)
+    image = 50 + 45 * np.sin(3 * x + phase[0]) * np.cos(2 * y + phase[1]) + rng.normal(0, 0.5, (size, size))
+    image = image.astype(np.float32)
+    image[rng.random((size, size)) < 0.1] = nodata
+    transform = from_bounds(*MOROCCO_BOUNDS, size, size)
+    return Raster(image, MOROCCO_BOUNDS, rasterio.crs.CRS.from_epsg(4326), transform, nodata)
+
+
+def bench_create_map(data):
+    # 🗺️ Cartographie : valeurs moyennes, carte de la page rendue en HTML
+    gdf, _ = data
+    return render_map(build_map(gdf, "TEMPMOY"))
+
+
+def bench_create_days_map(data):
+    # 🗺️ Cartographie : valeurs selon les jours, un seul jour
+    gdf, observations = data
+    return render_map(build_days_map(gdf, observations, "prec", -3))
+
+
+def bench_create_days_animation(data):
+    # 🗺️ Cartographie : valeurs selon les jours, les 7 jours animés (mode par défaut de la page)
+    gdf, observations = data
+    return render_map(build_days_map(gdf, observations, "prec", 0, animate=True))
+
+
+def _station_series(gdf, observations):
+    return np.stack([observations.select(variable, stations=gdf["FID_1"])[1] for variable in ("temp", "hum", "prec")], axis=1)
+
+
+def bench_station_charts(data):
+    gdf, observations = data
+    # 📈 Graphique temporel : carte avec les séries des stations, tracées par le navigateur
+    carte = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)
+    add_plugins(carte, "graphique")
+    add_point_layer(carte, gdf, colors="blue", radii=2, charts=chart_data(_station_series(gdf, observations)))
+    return render_map(carte)
+
+
+def bench_nearest(data, queries=1_000):
+    # 📍 Recherche par coordonnées : index KD-tree, k plus proches voisins et leurs valeurs journalières
+    gdf, observations = data
+    rng = np.random.default_rng(1)
+    index = NearestStations(gdf)
+    results = index.results(rng.uniform(22, 35, queries), rng.uniform(-16, -2, queries), k=5, columns=["Nom_Region"])
+    pd.concat([results, observations.frame(gdf["FID_1"].to_numpy()[results["position"]], list(VARIABLE_LABELS))], axis=1)
+
+
+def bench_spatial_query(data):
+    # 🔍 Requêtes spatiales : index STRtree, proximité, filtre attributaire et buffers
+    gdf, observations = data
+    index = StationIndex(gdf)
+    mask = index.near(Point(-7.5, 31.5), distance_km=200)
+    mask &= attribute_mask(observations.select("prec", days=(-3, -3), stations=gdf["FID_1"])[1][:, 0], min_value=20, max_value=80)
+    index.buffer_union(mask, 10)
+
+
+@functools.cache
+def _work_dir():
+    # Dossier temporaire des fichiers préparés, supprimé à la fin du processus
+    return tempfile.TemporaryDirectory(prefix="clima-bench-")
+
+
+def geotiff_file(size):
+    """
+    Écrit un raster synthétique en GeoTIFF tuilé et compressé comme les rasters de cliptemp.
+    :return: Chemin du fichier.
+    """
+    raster = synthetic_raster(size)
+    path = os.path.join(_work_dir().name, f"raster_{size}.tif")
+    with rasterio.open(path, "w", driver="GTiff", width=size, height=size, count=1, dtype="float32",
+                       crs=raster.crs, transform=raster.transform, nodata=raster.nodata, tiled=True, compress="deflate") as dst:
+        dst.write(raster.image, 1)
+    return path
+
+
+def bench_read_geotiff(path):
+    # 🗺 Rasters : décodage d'un GeoTIFF (cas sans cube de données)
+    with rasterio.open(path) as src:
+        src.read(1)
+
+
+def bench_overlay(raster):
+    # 🗺 Rasters / 🌍 Variations : coloration et encodage PNG de l'image
+    return encode_overlay(raster.image, 0, 100, nodata=raster.nodata)
+
+
+def bench_sample(raster, points=10_000):
+    # 🗺 Rasters : échantillonnage de points
+    rng = np.random.default_rng(2)
+    sample_raster(raster, rng.uniform(21, 36, points), rng.uniform(-17, -1, points))
+
+
+def bench_difference(raster):
+    # 🌍 Variations : écart entre deux jours et statistiques
+    other = synthetic_raster(raster.image.shape[0], seed=1)
+    difference_from_rasters(raster, other, 0, -1)
+
+
+def bench_timelapse(raster, frames=7):
+    # 🔄 Timelapse : rendu des images et encodage GIF
+    rendered = [render_frame("Précipitation", day, raster.image, raster.bounds, raster.nodata) for day in range(-frames + 1, 1)]
+    spec = FORMATS["GIF"]
+    return iio.imwrite("<bytes>", np.stack(rendered), extension=spec["extension"], **spec["options"])
+
+
+def cases(station_sizes, raster_sizes):
+    """
+    Liste des cas : (nom, fabrique des données, fonction mesurée).
+    """
+    for n in station_sizes:
+        stations = lambda n=n: synthetic_data(n)
+        yield f"cartographie.create_map[{n}]", stations, bench_create_map
+        yield f"cartographie.create_days_map[{n}]", stations, bench_create_days_map
+        yield f"cartographie.create_days_animation[{n}]", stations, bench_create_days_animation
+        yield f"graphique.create_map[{n}]", stations, bench_station_charts
+        yield f"recherche.nearest[{n}]", stations, bench_nearest
+        yield f"requetes.spatial_query[{n}]", stations, bench_spatial_query
+    for size in raster_sizes:
+        raster = lambda size=size: synthetic_raster(size)
+        yield f"rasters.read_geotiff[{size}]", lambda size=size: geotiff_file(size), bench_read_geotiff
+        yield f"rasters.overlay[{size}]", raster, bench_overlay
+        yield f"rasters.sample[{size}]", raster, bench_sample
+        yield f"variations.difference[{size}]", raster, bench_difference
+        if size <= 1024:
+            yield f"timelapse.gif[{size}]", raster, bench_timelapse
+
+
+def measure(func, data, repeat=3):
+    """
+    Meilleur temps sur repeat exécutions, pic mémoire Python/NumPy (tracemalloc)
+    et taille de la sortie (HTML ou fichier) si la fonction en renvoie une.
+    """
+    times, output = [], None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        output = func(data)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = len(output.encode() if isinstance(output, str) else output) if isinstance(output, (str, bytes)) else None
+    return {"time_s": round(min(times), 5), "peak_mb": round(peak / 2 ** 20, 3), "output_bytes": size}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare aux mesures de référence ; un cas absent de la référence compte comme une régression.
+    :return: Liste des régressions (cas, mesure, référence, valeur).
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            regressions.append((name, "référence", None, None))
+            continue
+        for metric in ("time_s", "peak_mb", "output_bytes"):
+            if result.get(metric) is None or not reference.get(metric):
+                continue
+            # Petit plancher absolu pour ne pas échouer sur le bruit des cas très rapides
+            floor = {"time_s": 0.005, "peak_mb": 0.5, "output_bytes": 1024}[metric]
+            if result[metric] > reference[metric] * (1 + tolerance) + floor:
+                regressions.append((name, metric, reference[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai des chemins critiques des pages")
+    parser.add_argument("--stations", type=int, nargs="+", default=list(STATION_SIZES), metavar="N")
+    parser.add_argument("--rasters", type=int, nargs="+", default=list(RASTER_SIZES), metavar="TAILLE")
+    parser.add_argument("--filter", default="", help="ne lancer que les cas contenant ce texte")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="enregistrer les mesures comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="dépassement toléré (0.25 = +25 %%)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, make_data, func in cases(args.stations, args.rasters):
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, make_data(), args.repeat)
+        result = results[name]
+        size = f"{result['output_bytes']:>11d} o" if result["output_bytes"] is not None else " " * 13
+        print(f"{name:40s} {result['time_s']:>9.4f} s {result['peak_mb']:>9.2f} Mo {size}", flush=True)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Référence enregistrée dans {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Pas de référence ({args.baseline}) : lancer avec --save-baseline pour en créer une.")
+        return 1
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, metric, reference, value in regressions:
+        if reference is None:
+            print(f"SANS RÉFÉRENCE {name} : lancer avec --save-baseline pour l'ajouter")
+        else:
+            print(f"RÉGRESSION {name} {metric} : {reference} -> {value}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
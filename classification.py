@@ -0,0 +1,122 @@
+import numpy as np
+
+# Table de classification : seuils, couleurs et rayons par variable.
+# Une valeur v appartient à la classe i si breaks[i-1] <= v < breaks[i].
+# "colors" et "radii" contiennent soit une valeur par classe, soit une seule valeur.
+CLASSIFICATIONS = {
+    "TEMPMOY": {
+        "title": "Temperature moyenne en C°",
+        "breaks": [19.4, 21.9, 25],
+        "colors": ['#fcc5c0', '#df65b0', '#ce1256', 'red'],
+        "radii": [5],
+        "legend": "classes",
+        "legend_min": 17.6,
+    },
+    "HUMIDITEMO": {
+        "title": "Humidité moyenne en % ",
+        "breaks": [21.9, 31.5, 35.7, 40.6],
+        "colors": ['#ffffcc', '#a1dab4', '#41b6c4', '#225ea8', '#e31a1c'],
+        "radii": [5],
+        "legend": "classes",
+        "legend_min": 18.7,
+    },
+    "PRECIPIT": {
+        "title": "Précipitation en mm",
+        "breaks": [22, 46, 72, 100],
+        "colors": ['blue'],
+        "radii": [1, 2, 3, 4, 2],
+        "legend": "tailles",
+    },
+    "TEMPERAT": {
+        "title": "Température en C° ",
+        "breaks": [5, 10, 15, 20],
+        "colors": ['red'],
+        "radii": [1, 2, 3, 4, 2],
+        "legend": "tailles",
+    },
+    "HUMIDITE": {
+        "title": "Humidité en %",
+        "breaks": [12, 25, 38, 50],
+        "colors": ['green'],
+        "radii": [1, 2, 3, 4, 2],
+        "legend": "tailles",
+    },
+}
+
+# Codes des variables du magasin d'observations (observations.py) -> classification
+VARIABLE_CLASSIFICATIONS = {"prec": "PRECIPIT", "temp": "TEMPERAT", "hum": "HUMIDITE"}
+
+DEFAULT_CLASSIFICATION = {"title": "", "breaks": [], "colors": ['blue'], "radii": [2], "legend": None}
+
+
+def get_classification(column):
+    """
+    Retrouve la classification d'une colonne : code de variable (ex. "prec"),
+    correspondance exacte, sinon préfixe (ex. "PRECIPITJ_1" -> "PRECIPIT").
+    :param column: Nom de la colonne ou code de variable.
+    :return: Dictionnaire de classification.
+    """
+    column = VARIABLE_CLASSIFICATIONS.get(column, column)
+    if column in CLASSIFICATIONS:
+        return CLASSIFICATIONS[column]
+    for key, classification in CLASSIFICATIONS.items():
+        if column.startswith(key):
+            return classification
+    return DEFAULT_CLASSIFICATION
+
+
+def classify(column, values):
+    """
+    Classe une colonne entière en une seule opération vectorisée.
+    :param column: Nom de la colonne.
+    :param values: Tableau des valeurs.
+    :return: Tuple (rayons, couleurs) sous forme de tableaux NumPy.
+    """
+    classification = get_classification(column)
+    values = np.asarray(values, dtype=float)
+    classes = np.digitize(values, classification["breaks"])
+
+    colors = np.asarray(classification["colors"], dtype=object)
+    radii = np.asarray(classification["radii"], dtype=float)
+    colors = colors[classes] if colors.size > 1 else np.broadcast_to(colors, values.shape)
+    radii = radii[classes] if radii.size > 1 else np.broadcast_to(radii, values.shape)
+    return radii, colors
+
+
+def get_legend_html(column):
+    """
+    Génère la légende HTML d'une colonne à partir de la table de classification.
+    :param column: Nom de la colonne.
+    :return: Chaîne HTML représentant la légende.
+    """
+    classification = get_classification(column)
+    breaks = classification["breaks"]
+    colors = classification["colors"]
+    radii = classification["radii"]
+
+    if classification["legend"] == "classes":
+        # Une entrée par intervalle borné, cercle de taille fixe
+        bounds = [classification["legend_min"]] + breaks
+        items = [
+            f'<p style="margin:5px;color:black">[{bounds[i]}-{bounds[i + 1]}]</p>\n'
+            f'            <div style="margin:5px;"><svg width="20" height="20"><circle cx="10" cy="10" r="7" fill="{colors[i % len(colors)]}" /></svg></div>'
+            for i in range(len(breaks))
+        ]
+    elif classification["legend"] == "tailles":
+        # Une entrée par seuil, cercle proportionnel au rayon de la classe
+        items = [
+            f'<p style="margin:5px;color:green">{breaks[i]}</p>\n'
+            f'            <div style="margin:5px;"><svg width="20" height="20"><circle cx="10" cy="10" r="{2 * radii[i % len(radii)] + 1}" fill="{colors[i % len(colors)]}" /></svg></div>'
+            for i in range(len(breaks))
+        ]
+    else:
+        return ""
+
+    items = "\n            ".join(items)
+    return f"""
+        <div class="legend">
+            <p style="margin:5px;">Légende:</p>
+            <p style="margin:5px;">{classification["title"]}</p>
+            {items}
+        </div>
+        """
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy
+
+from raster_access import DAY_OFFSETS, RASTER_DIR, VARIABLE_CODES, raster_path
+
+# COGs générés à partir de cliptemp/{variable}{jour}.tif, nommés comme sur le
+# bucket S3 ({variable}cog{jour}.tif) : COG_BASE_URL=cliptemp/cog les sert en local.
+COG_DIR = os.path.join(RASTER_DIR, "cog")
+MANIFEST_FILE = "manifest.json"
+
+# Quantification optionnelle float32 -> int16 : valeur = entier * échelle
+QUANTIZE_SCALE = 0.01
+QUANTIZE_NODATA = -32768
+
+
+def cog_name(variable, day_offset):
+    return f"{variable}cog{day_offset}.tif"
+
+
+def _quantize(src):
+    """
+    Convertit la première bande en int16 (échelle QUANTIZE_SCALE) dans un GeoTIFF en mémoire.
+    :return: MemoryFile ouvert.
+    """
+    image = src.read(1, masked=True).astype(np.float64)
+    data = np.round(image / QUANTIZE_SCALE)
+    if np.nanmax(np.abs(data.compressed()), initial=0) >= 2 ** 15 - 1:
+        raise ValueError(f"{src.name} : valeurs hors de la plage int16 avec l'échelle {QUANTIZE_SCALE}")
+    data = data.filled(QUANTIZE_NODATA).astype(np.int16)
+
+    profile = dict(src.profile, driver="GTiff", dtype="int16", nodata=QUANTIZE_NODATA)
+    memfile = MemoryFile()
+    with memfile.open(**profile) as dst:
+        dst.write(data, 1)
+        dst.scales = (QUANTIZE_SCALE,)
+        dst.offsets = (0.0,)
+    return memfile
+
+
+def validate_cog(path, source, blocksize, scale=None):
+    """
+    Vérifie un COG : structure COG déclarée par GDAL, tuilage interne, aperçus
+    présents et valeurs identiques à la source (à la demi-échelle près si quantifié).
+    :return: Tuple (liste des erreurs, écart maximal avec la source).
+    """
+    errors = []
+    with rasterio.open(path) as cog, rasterio.open(source) as src:
+        if cog.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") != "COG":
+            errors.append("structure COG absente")
+        if cog.block_shapes[0] != (blocksize, blocksize):
+            errors.append(f"tuiles {cog.block_shapes[0]} au lieu de {blocksize}x{blocksize}")
+        if max(cog.width, cog.height) > blocksize and not cog.overviews(1):
+            errors.append("aucun aperçu")
+
+        expected = src.read(1, masked=True)
+        actual = cog.read(1, masked=True).astype(np.float64) * cog.scales[0] + cog.offsets[0]
+        if not np.array_equal(np.ma.getmaskarray(expected), np.ma.getmaskarray(actual)):
+            errors.append("masque nodata différent")
+        difference = np.abs(actual - expected)
+        max_error = float(difference.max()) if difference.count() else 0.0
+        tolerance = scale / 2 + 1e-6 if scale else 0.0
+        if max_error > tolerance:
+            errors.append(f"écart maximal {max_error} > {tolerance}")
+    return errors, max_error
+
+
+def convert_to_cog(source, destination, compress="DEFLATE", blocksize=256, quantize=False):
+    """
+    Convertit un GeoTIFF en COG validé : tuiles internes, aperçus, prédicteur et compression.
+    :param source: Chemin du GeoTIFF.
+    :param destination: Chemin du COG.
+    :param compress: DEFLATE ou ZSTD.
+    :param blocksize: Taille des tuiles internes.
+    :param quantize: Stocke les valeurs en int16 mis à l'échelle au lieu de float32.
+    :return: Entrée du manifeste.
+    """
+    tmp = destination + ".tmp"
+    options = {"driver": "COG", "compress": compress, "blocksize": blocksize, "overviews": "AUTO",
+               "overview_resampling": "AVERAGE", "level": 9}
+    with rasterio.open(source) as src:
+        if quantize:
+            with _quantize(src) as memfile, memfile.open() as quantized:
+                copy(quantized, tmp, predictor=2, **options)
+        else:
+            copy(src, tmp, predictor=3 if np.dtype(src.dtypes[0]).kind == "f" else 2, **options)
+    os.replace(tmp, destination)
+
+    scale = QUANTIZE_SCALE if quantize else None
+    errors, max_error = validate_cog(destination, source, blocksize, scale)
+    with rasterio.open(destination) as cog:
+        overviews = cog.overviews(1)
+    return {
+        "source": source,
+        "cog": destination,
+        "source_bytes": os.path.getsize(source),
+        "cog_bytes": os.path.getsize(destination),
+        "ratio": round(os.path.getsize(source) / os.path.getsize(destination), 2),
+        "compress": compress,
+        "blocksize": blocksize,
+        "overviews": overviews,
+        "scale": scale,
+        "max_error": max_error,
+        "valid": not errors,
+        "errors": errors,
+    }
+
+
+def _convert(args):
+    return convert_to_cog(*args)
+
+
+def convert_all(directory=COG_DIR, compress="DEFLATE", blocksize=256, quantize=False, max_workers=None):
+    """
+    Convertit tous les rasters {variable}{jour}.tif en COG, en parallèle, et écrit le manifeste.
+    :param directory: Dossier de sortie.
+    :return: Liste des entrées du manifeste.
+    """
+    os.makedirs(directory, exist_ok=True)
+    jobs = [
+        (raster_path(variable, day_offset), os.path.join(directory, cog_name(variable, day_offset)), compress, blocksize, quantize)
+        for variable in VARIABLE_CODES.values()
+        for day_offset in DAY_OFFSETS
+        if os.path.exists(raster_path(variable, day_offset))
+    ]
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1)) as executor:
+        entries = list(executor.map(_convert, jobs))
+
+    manifest = {
+        "files": entries,
+        "source_bytes": sum(entry["source_bytes"] for entry in entries),
+        "cog_bytes": sum(entry["cog_bytes"] for entry in entries),
+        "valid": all(entry["valid"] for entry in entries),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion des rasters de cliptemp/ en COG")
+    parser.add_argument("--directory", default=COG_DIR)
+    parser.add_argument("--compress", choices=["DEFLATE", "ZSTD"], default="DEFLATE")
+    parser.add_argument("--blocksize", type=int, default=256)
+    parser.add_argument("--quantize", action="store_true", help="stocker les valeurs en int16 mis à l'échelle")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    entries = convert_all(args.directory, args.compress, args.blocksize, args.quantize, args.workers)
+    for entry in entries:
+        status = "OK " if entry["valid"] else "ERR"
+        print(f"{status} {entry['cog']:32s} {entry['source_bytes']:>8d} -> {entry['cog_bytes']:>8d} octets (x{entry['ratio']}) {'; '.join(entry['errors'])}")
+    print(f"Total : {sum(e['source_bytes'] for e in entries)} -> {sum(e['cog_bytes'] for e in entries)} octets")
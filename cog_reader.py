@@ -0,0 +1,383 @@
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import rasterio
+import streamlit as st
+from rasterio.coords import BoundingBox
+from rasterio.windows import Window, from_bounds
+
+from raster_overlay import encode_overlay
+
+# URL de base des COGs : bucket S3, serveur HTTP local ou dossier local
+# (ex. COG_BASE_URL=cliptemp/cog pour lire les COGs générés par cog_convert.py).
+COG_BASE_URL = os.environ.get("COG_BASE_URL", "https://cog2023.s3.eu-north-1.amazonaws.com/cog/")
+
+# Configuration GDAL pour la lecture distante : pas de listage du dossier,
+# cache des en-têtes et des blocs, requêtes de plage fusionnées.
+COG_ENV = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif",
+    "CPL_VSIL_CURL_CACHE_SIZE": str(64 * 1024 * 1024),
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(16 * 1024 * 1024),
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "GDAL_INGESTED_BYTES_AT_OPEN": "32768",
+}
+
+# Cache LRU des blocs décodés, partagé par toutes les sessions du processus
+BLOCK_CACHE_SIZE = 512
+_block_cache = OrderedDict()
+_block_lock = threading.Lock()
+
+# Copie sur disque des blocs (un .npy par bloc), conservée entre les redémarrages
+# pour les COGs de version connue ; les plus anciens fichiers sont supprimés
+# au-delà de BLOCK_CACHE_BYTES
+BLOCK_CACHE_DIR = os.environ.get("COG_BLOCK_CACHE_DIR", os.path.join("cliptemp", "cog_blocks"))
+BLOCK_CACHE_BYTES = 256 * 1024 * 1024
+
+# Version des COGs distants (ETag ou Last-Modified), redemandée au plus toutes
+# les VERSION_TTL secondes par une requête HEAD
+VERSION_TTL = 60
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def cog_url(name, base_url=COG_BASE_URL):
+    """
+    Construit l'adresse d'un COG à partir de l'URL de base configurée.
+    :param name: Nom du fichier (ex. "humcog-1.tif").
+    :param base_url: URL de base (http(s)://, file:// ou dossier local).
+    :return: Adresse lisible par rasterio.
+    """
+    if base_url.startswith("file://"):
+        base_url = base_url[len("file://"):]
+    return f"{base_url.rstrip('/')}/{name}"
+
+
+def _remote_url(url):
+    url = url[len("/vsicurl/"):] if url.startswith("/vsicurl/") else url
+    return url if url.startswith(("http://", "https://")) else None
+
+
+def _source_version(url):
+    """
+    Version d'un COG pour les caches : date de modification d'un fichier local,
+    ETag (ou à défaut Last-Modified) d'un COG distant.
+    :param url: Adresse du COG.
+    :return: Version, ou None si elle est inconnue.
+    """
+    if os.path.exists(url):
+        return os.path.getmtime(url)
+    remote = _remote_url(url)
+    if remote is None:
+        return None
+    now = time.monotonic()
+    with _versions_lock:
+        expires, version = _versions.get(remote, (0, None))
+    if now < expires:
+        return version
+    try:
+        request = urllib.request.Request(remote, method="HEAD")
+        with urllib.request.urlopen(request, timeout=5) as response:
+            version = response.headers.get("ETag") or response.headers.get("Last-Modified")
+    except OSError:
+        pass  # Serveur injoignable : la dernière version connue est gardée
+    with _versions_lock:
+        _versions[remote] = (now + VERSION_TTL, version)
+    return version
+
+
+def overview_level(src, zoom, tile_size=256):
+    """
+    Choisit l'aperçu le plus réduit dont la résolution reste plus fine que
+    celle de la carte au niveau de zoom demandé.
+    :param src: Dataset rasterio (EPSG:4326).
+    :param zoom: Niveau de zoom Leaflet.
+    :return: Indice de l'aperçu, ou None pour la pleine résolution.
+    """
+    if zoom is None:
+        return None
+    map_resolution = 360 / 2 ** zoom / tile_size
+    level = None
+    for index, factor in enumerate(src.overviews(1)):
+        if src.res[0] * factor <= map_resolution:
+            level = index
+    return level
+
+
+def _block_path(key):
+    return os.path.join(BLOCK_CACHE_DIR, f"{hashlib.sha1(repr(key).encode()).hexdigest()}.npy")
+
+
+def _load_block(key):
+    try:
+        block = np.load(_block_path(key))
+    except (OSError, ValueError):
+        return None
+    block.setflags(write=False)
+    return block
+
+
+def _save_blocks(blocks):
+    """
+    Écrit des blocs sur le disque (écriture atomique) puis supprime les plus
+    anciens fichiers si le dossier dépasse BLOCK_CACHE_BYTES.
+    :param blocks: Dictionnaire clé -> bloc.
+    """
+    os.makedirs(BLOCK_CACHE_DIR, exist_ok=True)
+    for key, block in blocks.items():
+        path = _block_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, block)
+        os.replace(tmp, path)
+
+    entries = []
+    for entry in os.scandir(BLOCK_CACHE_DIR):
+        if entry.name.endswith(".npy"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= BLOCK_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _read_blocks(src, key, window):
+    """
+    Lit une fenêtre en passant par le cache de blocs (mémoire, puis disque si la
+    version du COG est connue) : seuls les blocs absents sont lus, en une seule
+    lecture couvrant leur emprise.
+    """
+    block_height, block_width = src.block_shapes[0]
+    rows = range(window.row_off // block_height, math.ceil((window.row_off + window.height) / block_height))
+    cols = range(window.col_off // block_width, math.ceil((window.col_off + window.width) / block_width))
+    persistent = key[1] is not None
+
+    with _block_lock:
+        missing = [(row, col) for row in rows for col in cols if key + (row, col) not in _block_cache]
+    if missing and persistent:
+        loaded = {(row, col): _load_block(key + (row, col)) for row, col in missing}
+        loaded = {position: block for position, block in loaded.items() if block is not None}
+        with _block_lock:
+            for position, block in loaded.items():
+                _block_cache[key + position] = block
+        missing = [position for position in missing if position not in loaded]
+    if missing:
+        row_min, row_max = min(r for r, _ in missing), max(r for r, _ in missing)
+        col_min, col_max = min(c for _, c in missing), max(c for _, c in missing)
+        top, left = row_min * block_height, col_min * block_width
+        bottom = min((row_max + 1) * block_height, src.height)
+        right = min((col_max + 1) * block_width, src.width)
+        data = src.read(1, window=Window(left, top, right - left, bottom - top))
+        blocks = {}
+        for row, col in missing:
+            y, x = row * block_height - top, col * block_width - left
+            block = data[y:y + block_height, x:x + block_width].copy()
+            block.setflags(write=False)
+            blocks[key + (row, col)] = block
+        with _block_lock:
+            _block_cache.update(blocks)
+        if persistent:
+            _save_blocks(blocks)
+    with _block_lock:
+        while len(_block_cache) > BLOCK_CACHE_SIZE:
+            _block_cache.popitem(last=False)
+
+    # Assemblage des blocs puis découpe de la fenêtre demandée
+    top, left = rows.start * block_height, cols.start * block_width
+    mosaic = np.empty((min(rows.stop * block_height, src.height) - top, min(cols.stop * block_width, src.width) - left), dtype=src.dtypes[0])
+    with _block_lock:
+        for row in rows:
+            for col in cols:
+                block = _block_cache.get(key + (row, col))
+                if block is None:
+                    block = src.read(1, window=Window(col * block_width, row * block_height, block_width, block_height).intersection(Window(0, 0, src.width, src.height)))
+                else:
+                    _block_cache.move_to_end(key + (row, col))
+                y, x = row * block_height - top, col * block_width - left
+                mosaic[y:y + block.shape[0], x:x + block.shape[1]] = block
+    y, x = window.row_off - top, window.col_off - left
+    return mosaic[y:y + window.height, x:x + window.width]
+
+
+def read_cog(url, bounds=None, zoom=None):
+    """
+    Lit uniquement la partie d'un COG visible sur la carte, au niveau d'aperçu
+    adapté au zoom.
+    :param url: Adresse du COG.
+    :param bounds: Emprise visible (ouest, sud, est, nord) en degrés, ou None pour tout le raster.
+    :param zoom: Niveau de zoom de la carte, ou None pour la pleine résolution.
+    :return: Tuple (image, bounds, nodata) de la fenêtre lue.
+    """
+    with rasterio.Env(**COG_ENV):
+        with rasterio.open(url) as src:
+            level = overview_level(src, zoom)
+
+        open_options = {} if level is None else {"overview_level": level}
+        with rasterio.open(url, **open_options) as src:
+            full = Window(0, 0, src.width, src.height)
+            if bounds is None:
+                window = full
+            else:
+                window = from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths()
+                try:
+                    window = window.intersection(full)
+                except rasterio.errors.WindowError:
+                    window = full
+            window = Window(int(window.col_off), int(window.row_off), int(window.width), int(window.height))
+
+            key = (url, _source_version(url), level)
+            img = _read_blocks(src, key, window)
+            nodata = src.nodata
+            if (src.scales[0], src.offsets[0]) != (1.0, 0.0):
+                # COG quantifié en int16 : retour aux valeurs physiques, nodata en NaN
+                valid = img != src.nodata
+                img = np.where(valid, img * src.scales[0] + src.offsets[0], np.nan).astype(np.float32)
+                nodata = None
+            window_bounds = BoundingBox(*rasterio.windows.bounds(window, src.transform))
+
+    return img, window_bounds, nodata
+
+
+def snap_bounds(bounds, zoom):
+    """
+    Élargit une emprise à la grille des tuiles 256 px du niveau de zoom : les
+    petits déplacements de la carte donnent la même fenêtre (et la même entrée
+    de cache), avec une marge d'au plus une tuile autour de la zone visible.
+    :param bounds: Emprise (ouest, sud, est, nord) en degrés, ou None.
+    :param zoom: Niveau de zoom de la carte, ou None.
+    :return: Emprise élargie, ou bounds inchangée sans zoom.
+    """
+    if bounds is None or zoom is None:
+        return bounds
+    step = 360 / 2 ** zoom
+    west, south, east, north = bounds
+    return (math.floor(west / step) * step, math.floor(south / step) * step,
+            math.ceil(east / step) * step, math.ceil(north / step) * step)
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _cog_overlay(url, version, bounds, zoom, vmin, vmax):
+    image, window_bounds, nodata = read_cog(url, bounds, zoom)
+    return encode_overlay(image, vmin, vmax, nodata=nodata), window_bounds
+
+
+def cog_overlay(url, vmin, vmax, bounds=None, zoom=None):
+    """
+    Image PNG colorée de la fenêtre visible d'un COG, lue et encodée une seule
+    fois par COG, version, fenêtre (emprise alignée sur la grille du zoom) et
+    légende, partagée entre les sessions.
+    :param url: Adresse du COG (un fichier par jour).
+    :param vmin: Valeur minimale de la légende.
+    :param vmax: Valeur maximale de la légende.
+    :param bounds: Emprise visible (ouest, sud, est, nord) en degrés, ou None pour tout le raster.
+    :param zoom: Niveau de zoom de la carte, ou None pour la pleine résolution.
+    :return: Tuple (URL de données PNG, emprise de la fenêtre lue).
+    """
+    return _cog_overlay(url, _source_version(url), snap_bounds(bounds, zoom), zoom, vmin, vmax)
+
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serveur de fichiers avec requêtes de plage et comptage des octets envoyés."""
+
+    counter = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if "Range" not in self.headers or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, last = self.headers["Range"].split("=", 1)[1].split(",")[0].strip().split("-")
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+        handle = open(path, "rb")
+        handle.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", "image/tiff")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self._remaining = end - start + 1
+        return handle
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "_remaining", None)
+        data = source.read() if remaining is None else source.read(remaining)
+        with self.counter.get_lock():
+            self.counter.value += len(data)
+        outputfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_files(directory, counter, ports):
+    # Processus séparé : la lecture rasterio garde le GIL pendant les requêtes HTTP
+    _RangeRequestHandler.counter = counter
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_RangeRequestHandler, directory=directory))
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def benchmark(directory, name, bounds, zoom):
+    """
+    Compare les octets téléchargés entre une lecture complète et une lecture
+    fenêtrée d'un COG servi par un serveur HTTP local.
+    """
+    global BLOCK_CACHE_DIR
+    counter, ports = multiprocessing.Value("q", 0), multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_files, args=(directory, counter, ports), daemon=True)
+    process.start()
+    port = ports.get(timeout=30)
+
+    # Cache disque vide le temps de la mesure
+    results, cache_dir, BLOCK_CACHE_DIR = {}, BLOCK_CACHE_DIR, tempfile.mkdtemp(prefix="cog-blocks-")
+    for run, (label, kwargs) in enumerate([("complète", {}), ("fenêtrée", {"bounds": bounds, "zoom": zoom})]):
+        # Une URL distincte par lecture pour ne pas profiter du cache vsicurl de la précédente
+        url = f"/vsicurl/http://127.0.0.1:{port}/{name}?run={run}"
+        _block_cache.clear()
+        counter.value = 0
+        img, _, _ = read_cog(url, **kwargs)
+        results[label] = (counter.value, img.shape)
+    process.terminate()
+    shutil.rmtree(BLOCK_CACHE_DIR, ignore_errors=True)
+    BLOCK_CACHE_DIR = cache_dir
+
+    size = os.path.getsize(os.path.join(directory, name))
+    print(f"{name} : {size} octets sur le disque")
+    for label, (sent, shape) in results.items():
+        print(f"  lecture {label:9s} : {sent:>9d} octets téléchargés, image {shape}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai de lecture fenêtrée des COGs")
+    parser.add_argument("--directory", default="cliptemp")
+    parser.add_argument("--name", default="humcog0.tif")
+    parser.add_argument("--bounds", type=float, nargs=4, default=[-8.5, 30.0, -5.5, 33.0], metavar=("OUEST", "SUD", "EST", "NORD"))
+    parser.add_argument("--zoom", type=int, default=7)
+    args = parser.parse_args()
+    benchmark(args.directory, args.name, args.bounds, args.zoom)
@@ -0,0 +1,232 @@
+import argparse
+import datetime
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import streamlit as st
+
+from classification import DEFAULT_CLASSIFICATION, get_classification
+from metrics import span
+
+# Fichier Parquet des stations partagé par toutes les pages
+STATION_PARQUET = "finalfinaaaaaaaaaal.parquet"
+
+# Historique des stations : jeu de données Parquet partitionné à la Hive,
+# stations/DATE=2023-11-22/[Nom_Region=.../]part-0.parquet. S'il existe, il
+# remplace le fichier unique.
+STATION_DATASET = "stations"
+
+# Colonnes chargées en catégories : région et identifiants à faible cardinalité
+CATEGORY_COLUMNS = ("Nom_Region", "CID", "FID_2", "OBJECTID")
+
+
+def compact_table(table):
+    """
+    Réduit les types d'une table Arrow avant conversion en DataFrame : mesures
+    décimales en float64, float64 en float32 pour les seules colonnes sans
+    classification (un arrondi float32 ferait changer de classe les valeurs
+    égales à un seuil), entiers au plus petit type suffisant (int16 au minimum),
+    région et identifiants répétés en catégories.
+    :param table: Table Arrow.
+    :return: Table Arrow compactée.
+    """
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if name in CATEGORY_COLUMNS:
+            column = column.dictionary_encode()
+        elif pa.types.is_decimal(column.type):
+            column = column.cast(pa.float64())
+        elif pa.types.is_float64(column.type) and get_classification(name) is DEFAULT_CLASSIFICATION:
+            column = column.cast(pa.float32())
+        elif pa.types.is_int64(column.type) and len(column):
+            bounds = pc.min_max(column)
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            for target in (np.int16, np.int32):
+                if low is not None and np.iinfo(target).min <= low and high <= np.iinfo(target).max:
+                    column = column.cast(pa.from_numpy_dtype(target))
+                    break
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def _to_geodataframe(table):
+    with span("arrow_to_pandas"):
+        df = compact_table(table).to_pandas()
+    # Décode la colonne WKB en une seule passe vectorisée
+    with span("wkb_decode"):
+        geometry = gpd.GeoSeries.from_wkb(df.pop("geometry"), crs="EPSG:4326")
+    return gpd.GeoDataFrame(df, geometry=geometry)
+
+
+def _projection(columns):
+    # La géométrie est toujours lue avec les colonnes demandées
+    return None if columns is None else list(dict.fromkeys(list(columns) + ["geometry"]))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _read_stations(path, mtime, columns=None):
+    """
+    Lit les colonnes demandées du fichier Parquet et décode la colonne WKB.
+    :param path: Chemin du fichier Parquet.
+    :param mtime: Date de modification du fichier (clé de cache uniquement).
+    :param columns: Colonnes à lire, ou None pour toutes.
+    :return: GeoDataFrame des stations.
+    """
+    with span("parquet_read"):
+        table = pq.read_table(path, columns=_projection(columns))
+    return _to_geodataframe(table)
+
+
+def column_range(column, path=STATION_PARQUET):
+    """
+    Minimum et maximum d'une colonne lus dans les statistiques des groupes de
+    lignes du fichier Parquet, sans lire les données.
+    :param column: Nom de la colonne.
+    :param path: Chemin du fichier Parquet.
+    :return: Tuple (min, max), ou (None, None) sans statistiques.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    index = metadata.schema.to_arrow_schema().get_field_index(column)
+    lows, highs = [], []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None, None
+        lows.append(statistics.min)
+        highs.append(statistics.max)
+    return (min(lows), max(highs)) if lows else (None, None)
+
+
+def _has_dataset(root):
+    return os.path.isdir(root) and any(name.startswith("DATE=") for name in os.listdir(root))
+
+
+def _partitioning(folder):
+    # Partition par région seulement si le dossier de la date en contient
+    if any(name.startswith("Nom_Region=") for name in os.listdir(folder)):
+        return ds.partitioning(pa.schema([("Nom_Region", pa.string())]), flavor="hive")
+    return None
+
+
+def add_station_snapshot(source=STATION_PARQUET, root=STATION_DATASET, by_region=False):
+    """
+    Ajoute au jeu partitionné les stations d'un fichier Parquet, une partition par date
+    (et par région si demandé). Les partitions déjà présentes pour ces dates sont remplacées.
+    :param source: Fichier Parquet des stations.
+    :param root: Dossier du jeu de données.
+    :param by_region: Partitionne aussi par Nom_Region.
+    :return: Dates ajoutées.
+    """
+    table = pq.read_table(source)
+    fields = [("DATE", pa.date32())] + ([("Nom_Region", pa.string())] if by_region else [])
+    ds.write_dataset(
+        table, root, format="parquet",
+        partitioning=ds.partitioning(pa.schema(fields), flavor="hive"),
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+    return sorted(set(table["DATE"].to_pylist()))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _file_dates(path, mtime):
+    # Une seule date dans les statistiques : aucune ligne à lire
+    low, high = column_range("DATE", path)
+    if low is not None and low == high:
+        return [low]
+    return sorted(pd.read_parquet(path, columns=["DATE"])["DATE"].unique())
+
+
+def available_dates(root=STATION_DATASET, path=STATION_PARQUET):
+    """
+    Dates disponibles, lues dans les noms des partitions sans ouvrir de fichier.
+    :param root: Dossier du jeu partitionné.
+    :param path: Fichier Parquet utilisé si le jeu partitionné n'existe pas.
+    :return: Liste triée de datetime.date.
+    """
+    if _has_dataset(root):
+        return sorted(datetime.date.fromisoformat(name.split("=", 1)[1]) for name in os.listdir(root) if name.startswith("DATE="))
+    return _file_dates(path, os.path.getmtime(path))
+
+
+def station_version(date=None, root=STATION_DATASET, path=STATION_PARQUET):
+    """
+    Date effective et clé de version des stations, pour les caches qui en dépendent.
+    :param date: Date voulue, ou None pour la plus récente.
+    :return: Tuple (date, version).
+    """
+    if not _has_dataset(root):
+        return date, ("file", path, os.path.getmtime(path))
+    date = date or available_dates(root)[-1]
+    partition = os.path.join(root, f"DATE={date}")
+    if not os.path.isdir(partition):
+        raise FileNotFoundError(f"Aucune donnée de stations pour le {date}")
+    return date, ("dataset", root, os.path.getmtime(partition))
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _read_dataset(root, date, regions, columns, version):
+    """
+    Lit une date du jeu partitionné : seul le dossier de la date est ouvert (les
+    autres dates ne sont ni listées ni lues, qu'elles soient partitionnées par
+    région ou non), filtre région et projection des colonnes appliqués par pyarrow.
+    La colonne DATE, absente des fichiers, est ajoutée en constante.
+    """
+    folder = os.path.join(root, f"DATE={date}")
+    dataset = ds.dataset(folder, format="parquet", partitioning=_partitioning(folder))
+    condition = ds.field("Nom_Region").isin(list(regions)) if regions else None
+    projection = _projection(columns)
+    if projection is not None:
+        projection = [name for name in projection if name != "DATE"]
+    with span("parquet_read"):
+        table = dataset.to_table(columns=projection, filter=condition)
+    if columns is None or "DATE" in columns:
+        table = table.append_column(pa.field("DATE", pa.date32()), pa.repeat(pa.scalar(date, pa.date32()), table.num_rows))
+    return _to_geodataframe(table)
+
+
+def load_stations(date=None, regions=None, columns=None, root=STATION_DATASET, path=STATION_PARQUET):
+    """
+    Retourne le GeoDataFrame des stations, chargé une seule fois par version.
+    Seules les colonnes demandées sont lues, avec des types compacts (voir
+    compact_table). Avec le jeu partitionné, seule la date demandée
+    (la plus récente par défaut) est lue ; sinon le fichier unique est lu et le
+    cache est invalidé dès qu'il est modifié sur le disque.
+    Le résultat est partagé entre les sessions : ne pas le modifier en place.
+    :param date: Date des observations, ou None pour la plus récente.
+    :param regions: Régions à garder, ou None pour toutes.
+    :param columns: Colonnes à lire (la géométrie est toujours lue), ou None pour toutes.
+    :param root: Dossier du jeu partitionné.
+    :param path: Fichier Parquet utilisé si le jeu partitionné n'existe pas.
+    :return: GeoDataFrame des stations.
+    """
+    date, version = station_version(date, root, path)
+    if version[0] == "dataset":
+        return _read_dataset(root, date, tuple(regions) if regions else None, tuple(columns) if columns else None, version)
+
+    filters = ["DATE"] if date is not None else []
+    filters += ["Nom_Region"] if regions else []
+    gdf = _read_stations(path, version[2], None if columns is None else tuple(dict.fromkeys(list(columns) + filters)))
+    if date is not None:
+        gdf = gdf[gdf["DATE"] == date]
+    if regions:
+        gdf = gdf[gdf["Nom_Region"].isin(regions)]
+    if columns is not None:
+        gdf = gdf[_projection(columns)]
+    return gdf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajout d'un fichier de stations au jeu partitionné par date")
+    parser.add_argument("source", nargs="?", default=STATION_PARQUET)
+    parser.add_argument("--root", default=STATION_DATASET)
+    parser.add_argument("--by-region", action="store_true", help="partitionner aussi par région")
+    args = parser.parse_args()
+    for added in add_station_snapshot(args.source, args.root, args.by_region):
+        print(f"{args.root}/DATE={added}")
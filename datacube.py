@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+import rasterio
+import streamlit as st
+from rasterio.coords import BoundingBox
+from rasterio.transform import Affine
+
+from raster_access import DAY_OFFSETS, RASTER_DIR, VARIABLE_CODES, raster_path
+
+# Cube variable x jour des rasters de cliptemp/ : un tableau NumPy sur le disque
+# (lu en mémoire mappée) et un fichier JSON pour la géoréférence.
+DATACUBE_DIR = os.path.join(RASTER_DIR, "datacube")
+CUBE_FILE = "cube.npy"
+META_FILE = "cube.json"
+
+
+class Datacube:
+    """
+    Cube (variable, jour, ligne, colonne) en mémoire mappée : chaque tranche est
+    une vue sans copie, seules les pages lues sont chargées en mémoire.
+    """
+
+    def __init__(self, directory=DATACUBE_DIR):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.array = np.load(os.path.join(directory, CUBE_FILE), mmap_mode="r")
+        self.variables = self.meta["variables"]
+        self.day_offsets = self.meta["day_offsets"]
+        self.transform = Affine(*self.meta["transform"])
+        self.crs = rasterio.crs.CRS.from_string(self.meta["crs"])
+        self.bounds = BoundingBox(*self.meta["bounds"])
+
+    def index(self, variable, day_offset):
+        return self.variables.index(variable), self.day_offsets.index(day_offset)
+
+    def is_current(self, variable, day_offset, mtime):
+        """
+        Vérifie que la tranche a été construite à partir de la version actuelle du GeoTIFF.
+        :param mtime: Date de modification du GeoTIFF source.
+        """
+        return self.meta["sources"].get(f"{variable}{day_offset}") == mtime
+
+    def nodata(self, variable, day_offset):
+        # Les GeoTIFF sources n'ont pas tous la même valeur nodata : elle est gardée par tranche
+        return self.meta["nodata"][f"{variable}{day_offset}"]
+
+    def day(self, variable, day_offset):
+        """
+        Image d'une variable pour un jour donné.
+        :return: Vue 2D en lecture seule.
+        """
+        return self.array[self.index(variable, day_offset)]
+
+    def stack(self, variable):
+        """
+        Les 7 jours d'une variable, pour les réductions multi-jours (ex. cube.stack("temp").mean(axis=0)).
+        :return: Vue 3D (jour, ligne, colonne) en lecture seule.
+        """
+        return self.array[self.variables.index(variable)]
+
+
+def build_datacube(directory=DATACUBE_DIR):
+    """
+    Empile les rasters de toutes les variables et de tous les jours dans un cube
+    sur le disque. Les GeoTIFF doivent partager la même grille (à 1e-9 degré près).
+    :param directory: Dossier de sortie.
+    :return: Chemin du cube.
+    """
+    variables, day_offsets = list(VARIABLE_CODES.values()), list(DAY_OFFSETS)
+    os.makedirs(directory, exist_ok=True)
+    tmp_cube, tmp_meta = os.path.join(directory, CUBE_FILE + ".tmp"), os.path.join(directory, META_FILE + ".tmp")
+
+    cube, meta = None, None
+    for i, variable in enumerate(variables):
+        for j, day_offset in enumerate(day_offsets):
+            path = raster_path(variable, day_offset)
+            with rasterio.open(path) as src:
+                if cube is None:
+                    cube = np.lib.format.open_memmap(tmp_cube, mode="w+", dtype=src.dtypes[0], shape=(len(variables), len(day_offsets), src.height, src.width))
+                    meta = {"variables": variables, "day_offsets": day_offsets, "shape": [src.height, src.width],
+                            "transform": list(src.transform)[:6], "crs": src.crs.to_string(), "bounds": list(src.bounds),
+                            "nodata": {}, "sources": {}}
+                elif ([src.height, src.width] != meta["shape"] or src.crs.to_string() != meta["crs"]
+                      or not src.transform.almost_equals(Affine(*meta["transform"]), precision=1e-9)):
+                    raise ValueError(f"{path} n'a pas la même grille que les autres rasters.")
+                src.read(1, out=cube[i, j])
+                meta["nodata"][f"{variable}{day_offset}"] = src.nodata
+            meta["sources"][f"{variable}{day_offset}"] = os.path.getmtime(path)
+
+    cube.flush()
+    del cube
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    # Remplacement atomique : les pages ne voient jamais un cube à moitié écrit
+    os.replace(tmp_cube, os.path.join(directory, CUBE_FILE))
+    os.replace(tmp_meta, os.path.join(directory, META_FILE))
+    return os.path.join(directory, CUBE_FILE)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _open_datacube(directory, mtime):
+    return Datacube(directory)
+
+
+def open_datacube(directory=DATACUBE_DIR):
+    """
+    Ouvre le cube une seule fois par version, ou None s'il n'a pas été construit.
+    :param directory: Dossier du cube.
+    :return: Datacube ou None.
+    """
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    return _open_datacube(directory, os.path.getmtime(meta_path))
+
+
+if __name__ == "__main__":
+    print(build_datacube())
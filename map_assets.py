@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import urllib.request
+from urllib.parse import urljoin, urlparse
+
+import branca.colormap as cm
+import folium
+import folium.plugins
+import streamlit as st
+
+# Ressources JavaScript/CSS de Leaflet et des plugins folium, copiées une fois
+# depuis les CDN puis servies en local : les cartes ne dépendent plus d'internet.
+# Sans manifeste, les CDN restent utilisés. Pour un réseau sans accès internet :
+# lancer python map_assets.py sur une machine connectée (même version de folium),
+# puis copier le dossier static/vendor/ (manifest.json compris) sur le serveur.
+ASSETS_DIR = os.path.join("static", "vendor")
+MANIFEST_PATH = os.path.join(ASSETS_DIR, "manifest.json")
+
+# URL des ressources vues par le navigateur. La route /assets du serveur de tuiles
+# (CLIMA_TILE_SERVER=1) est utilisée dès qu'il est activé : c'est elle qui envoie
+# les en-têtes de cache longue durée (immutable). Le service statique de Streamlit
+# (/app/static, server.enableStaticServing) sert de repli, sans ces en-têtes : le
+# navigateur revalide alors chaque fichier. CLIMA_ASSETS_URL désigne un autre
+# serveur (ex. proxy qui ajoute les en-têtes de cache).
+ASSETS_URL = os.environ.get("CLIMA_ASSETS_URL")
+
+# Plugins disponibles et plugins de chaque page, dans l'ordre d'ajout.
+# map_plugins.json ({"page": ["plugin", ...]}) remplace la liste d'une page.
+PLUGINS = {
+    "minimap": lambda: folium.plugins.MiniMap(),
+    "fullscreen": lambda: folium.plugins.Fullscreen(),
+    "mouse_position": lambda: folium.plugins.MousePosition(),
+    "draw": lambda: folium.plugins.Draw(export=True, draw_options={'rectangle': True}),
+    "geocoder": lambda: folium.plugins.Geocoder(),
+}
+PAGE_PLUGINS = {
+    "cartographie": ["minimap", "fullscreen", "mouse_position", "draw", "geocoder"],
+    "graphique": ["fullscreen", "mouse_position", "draw", "geocoder"],
+    "recherche": ["minimap", "fullscreen", "mouse_position", "draw", "geocoder"],
+    "requetes": ["fullscreen", "mouse_position", "draw", "geocoder"],
+    "rasters": ["fullscreen", "mouse_position", "draw", "minimap"],
+    "variations": ["mouse_position"],
+    "cogs": ["minimap", "fullscreen", "mouse_position", "draw"],
+}
+PLUGINS_CONFIG = os.environ.get("CLIMA_MAP_PLUGINS", "map_plugins.json")
+
+# Ressources ajoutées en dur par branca (légendes) et streamlit_folium
+EXTRA_JS = [
+    "https://cdnjs.cloudflare.com/ajax/libs/d3/3.5.5/d3.min.js",
+    "https://d3js.org/d3.v4.min.js",
+]
+
+CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _page_plugins(path, mtime):
+    config = dict(PAGE_PLUGINS)
+    if mtime is not None:
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+    for page, names in config.items():
+        unknown = set(names) - set(PLUGINS)
+        if unknown:
+            raise ValueError(f"{path} : plugins inconnus pour {page} : {', '.join(sorted(unknown))}")
+    return config
+
+
+def page_plugins(page):
+    """
+    Plugins d'une page, d'après PAGE_PLUGINS et map_plugins.json.
+    :param page: Nom court de la page.
+    :return: Liste des noms de plugins.
+    """
+    return _page_plugins(PLUGINS_CONFIG, _mtime(PLUGINS_CONFIG)).get(page, [])
+
+
+def add_plugins(carte, page):
+    """
+    Ajoute à la carte les plugins configurés pour la page, une seule fois chacun.
+    :param carte: Carte Folium.
+    :param page: Nom court de la page.
+    """
+    for name in dict.fromkeys(page_plugins(page)):
+        PLUGINS[name]().add_to(carte)
+
+
+def asset_version():
+    """
+    Version du manifeste et de la configuration des plugins, pour les caches de cartes rendues.
+    """
+    return _mtime(MANIFEST_PATH), _mtime(PLUGINS_CONFIG)
+
+
+def _walk(element):
+    yield element
+    for child in getattr(element, "_children", {}).values():
+        yield from _walk(child)
+
+
+def asset_urls():
+    """
+    URL des ressources de Leaflet et de tous les plugins, relevées sur une carte
+    de référence (la liste suit donc les versions de folium installées).
+    :return: Liste d'URL.
+    """
+    carte = folium.Map()
+    for plugin in PLUGINS.values():
+        plugin().add_to(carte)
+    folium.Marker([0, 0], icon=folium.Icon()).add_to(carte)
+    folium.GeoJson({"type": "Point", "coordinates": [0, 0]}).add_to(carte)
+    cm.LinearColormap(["white", "blue"]).add_to(carte)
+
+    urls = []
+    for element in _walk(carte):
+        urls += [url for _, url in getattr(element, "default_css", [])]
+        urls += [url for _, url in getattr(element, "default_js", [])]
+    return list(dict.fromkeys(urls + EXTRA_JS))
+
+
+def _fetch(url):
+    request = urllib.request.Request(url, headers={"User-Agent": "Morocco Clima"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def minify_css(text):
+    # Suppression des commentaires et des espaces superflus (sans toucher aux chaînes)
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", text).replace(";}", "}").strip()
+
+
+def _source_url(url):
+    return url.split("#")[0].split("?")[0]
+
+
+def _minified_url(url):
+    # Version minifiée publiée par le CDN à côté du fichier (ex. leaflet.draw.js -> leaflet.draw.min.js)
+    path = urlparse(url).path
+    if not path.endswith(".js") or path.endswith(".min.js"):
+        return None
+    return url.replace(path, path[:-len(".js")] + ".min.js", 1)
+
+
+def _local_path(url):
+    # Un dossier par dossier d'origine, tous au même niveau sous static/vendor
+    parsed = urlparse(url)
+    folder = hashlib.sha1(f"{parsed.netloc}{os.path.dirname(parsed.path)}".encode()).hexdigest()[:10]
+    return f"{folder}/{os.path.basename(parsed.path) or 'index'}"
+
+
+def vendor_assets(directory=ASSETS_DIR, fetch=_fetch):
+    """
+    Télécharge les ressources des cartes et leurs dépendances (images et polices
+    des CSS, dont les url() sont réécrites vers les copies locales), minifie les
+    CSS et écrit le manifeste {URL CDN: fichier local}. Pour le JavaScript, la
+    version .min.js publiée par le CDN est prise si elle existe ; sinon le fichier
+    est copié tel quel (pas de minifieur JavaScript sûr sans dépendance Node.js).
+    :param directory: Dossier de sortie.
+    :param fetch: Fonction url -> contenu (bytes).
+    :return: Manifeste.
+    """
+    manifest, pending = {}, [(url, True) for url in asset_urls()]
+
+    def dependency(url, match):
+        reference = match.group(1)
+        if reference.startswith(("data:", "#")):
+            return match.group(0)
+        target = urljoin(url, reference)
+        pending.append((target, False))
+        fragment = urlparse(target).fragment
+        return f'url("../{_local_path(target)}{"#" + fragment if fragment else ""}")'
+
+    while pending:
+        url, listed = pending.pop(0)
+        if _source_url(url) in manifest:
+            continue
+        content = None
+        if listed and _minified_url(url):
+            try:
+                content = fetch(_minified_url(url))
+            except OSError:
+                pass  # Pas de version minifiée sur le CDN
+        if content is None:
+            content = fetch(url)
+        path = _local_path(url)
+        if urlparse(url).path.endswith(".css"):
+            text = CSS_URL.sub(lambda match: dependency(url, match), content.decode("utf-8"))
+            if ".min." not in url:
+                text = minify_css(text)
+            content = text.encode("utf-8")
+        target = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(content)
+        manifest[_source_url(url)] = {"path": path, "hash": hashlib.sha1(content).hexdigest()[:12], "bytes": len(content), "listed": listed}
+
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_manifest(path, mtime):
+    if mtime is None:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _base_url():
+    if ASSETS_URL:
+        return ASSETS_URL.rstrip("/")
+    from tile_server import TILES_ENABLED, start_tile_server  # import local : tile_server dépend de map_layers
+    if TILES_ENABLED:
+        return f"{start_tile_server()}/assets"
+    return "/app/static/vendor"
+
+
+def local_urls():
+    """
+    Correspondance URL CDN -> URL locale (versionnée par le contenu) des ressources copiées.
+    :return: Dictionnaire, vide si les ressources n'ont pas été copiées.
+    """
+    manifest = _load_manifest(MANIFEST_PATH, _mtime(MANIFEST_PATH))
+    if not manifest:
+        return {}
+    base_url = _base_url()
+    return {url: f"{base_url}/{entry['path']}?v={entry['hash']}" for url, entry in manifest.items() if entry["listed"]}
+
+
+def localize_html(html):
+    """
+    Remplace dans une page rendue les URL des CDN par les ressources locales.
+    :param html: HTML de la carte.
+    :return: HTML modifié.
+    """
+    for url, local in local_urls().items():
+        html = html.replace(url, local)
+    return html
+
+
+def localize_map(carte):
+    """
+    Remplace les URL des CDN par les ressources locales sur les éléments d'une
+    carte, pour les composants qui lisent default_js/default_css (st_folium).
+    :param carte: Carte Folium.
+    """
+    urls = local_urls()
+    if not urls:
+        return
+    for element in _walk(carte):
+        for attribute in ("default_js", "default_css"):
+            links = getattr(element, attribute, None)
+            if links:
+                setattr(element, attribute, [(name, urls.get(url, url)) for name, url in links])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copie locale des ressources Leaflet et des plugins folium")
+    parser.add_argument("--directory", default=ASSETS_DIR)
+    args = parser.parse_args()
+    manifest = vendor_assets(args.directory)
+    for url, entry in manifest.items():
+        print(f"{entry['bytes']:>9d} {entry['path']:50s} {url}")
+    print(f"Total : {sum(entry['bytes'] for entry in manifest.values())} octets")
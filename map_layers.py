@@ -0,0 +1,426 @@
+import collections
+import os
+import threading
+import zlib
+
+import folium
+import numpy as np
+import streamlit as st
+import streamlit.components.v1 as components
+from branca.element import MacroElement
+from jinja2 import Template
+
+from map_assets import asset_version, localize_html
+from metrics import REGISTRY, record_payload, span, timed
+
+# Cache des cartes rendues (voir show_cached_map) : taille maximale en Mo
+# (0 le désactive) et compression zlib du HTML
+MAP_CACHE_MB = float(os.environ.get("CLIMA_MAP_CACHE_MB", "64"))
+MAP_CACHE_COMPRESS = os.environ.get("CLIMA_MAP_CACHE_COMPRESS", "1") == "1"
+
+
+class PointLayer(MacroElement):
+    """
+    Couche de points rendue en un seul bloc côté navigateur.
+    Les coordonnées, valeurs et couleurs sont transmises sous forme de tableaux
+    et les cercles sont dessinés par Leaflet sur un canvas unique.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data|tojson }};
+            var renderer = L.canvas({padding: 0.5});
+            var group = L.featureGroup();
+            // Graphique J-6 à J0 d'une station, dessiné en SVG à l'ouverture de son popup
+            function chartSvg(chart, values) {
+                var w = 320, h = 220, left = 34, right = 8, top = 22, bottom = 44;
+                var all = [];
+                values.forEach(function(row) { row.forEach(function(v) { if (v !== null) all.push(v); }); });
+                if (!all.length) return "Aucune donnée";
+                var low = Math.min.apply(null, all), high = Math.max.apply(null, all);
+                if (low === high) { low -= 1; high += 1; }
+                var n = chart.labels.length;
+                function x(k) { return (left + k * (w - left - right) / (n - 1)).toFixed(1); }
+                function y(v) { return (top + (high - v) * (h - top - bottom) / (high - low)).toFixed(1); }
+                var svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="' + w + '" height="' + h + '" font-family="sans-serif" font-size="9">',
+                           '<text x="' + w / 2 + '" y="11" text-anchor="middle" font-size="8.5">' + chart.title + '</text>',
+                           '<rect x="' + left + '" y="' + top + '" width="' + (w - left - right) + '" height="' + (h - top - bottom) + '" fill="none" stroke="#333"/>'];
+                for (var t = 0; t <= 4; t++) {
+                    var v = low + t * (high - low) / 4;
+                    svg.push('<line x1="' + left + '" x2="' + (w - right) + '" y1="' + y(v) + '" y2="' + y(v) + '" stroke="#ddd"/>');
+                    svg.push('<text x="' + (left - 3) + '" y="' + y(v) + '" dy="3" text-anchor="end">' + v.toFixed(1) + '</text>');
+                }
+                for (var k = 0; k < n; k++) {
+                    svg.push('<text x="' + x(k) + '" y="' + (h - bottom + 12) + '" text-anchor="middle">' + chart.labels[k] + '</text>');
+                }
+                values.forEach(function(row, s) {
+                    var path = "", color = chart.colors[s];
+                    row.forEach(function(v, k) {
+                        if (v === null) { path += " "; return; }
+                        path += (path === "" || path.slice(-1) === " " ? "M" : "L") + x(k) + "," + y(v);
+                        svg.push('<circle cx="' + x(k) + '" cy="' + y(v) + '" r="2.5" fill="' + color + '"/>');
+                    });
+                    svg.push('<path d="' + path + '" fill="none" stroke="' + color + '" stroke-width="1.5"/>');
+                    var lx = 4 + s * (w - 8) / values.length;
+                    svg.push('<line x1="' + lx + '" x2="' + (lx + 14) + '" y1="' + (h - 8) + '" y2="' + (h - 8) + '" stroke="' + color + '" stroke-width="2"/>');
+                    svg.push('<text x="' + (lx + 17) + '" y="' + (h - 5) + '" font-size="8">' + chart.names[s] + '</text>');
+                });
+                svg.push('</svg>');
+                return svg.join("");
+            }
+            function chartPopup(i) {
+                return function() { return chartSvg(data.chart, data.chart.values[i]); };
+            }
+            for (var i = 0; i < data.lat.length; i++) {
+                var marker = L.circleMarker([data.lat[i], data.lon[i]], {
+                    renderer: renderer,
+                    radius: data.radius.length > 1 ? data.radius[i] : data.radius[0],
+                    color: data.stroke,
+                    weight: data.weight,
+                    fill: true,
+                    fillColor: data.palette[data.color[i]],
+                    fillOpacity: data.fill_opacity
+                });
+                if (data.tooltip) {
+                    marker.bindTooltip(data.tooltip[i]);
+                } else if (data.label !== null) {
+                    marker.bindTooltip(data.value ? data.label + ": " + data.value[i] : data.label);
+                }
+                if (data.popup) {
+                    marker.bindPopup(data.popup[i]);
+                } else if (data.chart) {
+                    marker.bindPopup(chartPopup(i), {maxWidth: 340});
+                }
+                group.addLayer(marker);
+            }
+            // Changement de jour côté navigateur : restyle des cercles existants
+            group.setFrame = function(k) {
+                var frame = data.frames[k];
+                var markers = group.getLayers();
+                for (var i = 0; i < markers.length; i++) {
+                    markers[i].setStyle({fillColor: data.palette[frame.color[i]]});
+                    markers[i].setRadius(frame.radius.length > 1 ? frame.radius[i] : frame.radius[0]);
+                    if (!data.tooltip && markers[i].getTooltip()) {
+                        markers[i].setTooltipContent(frame.value ? frame.label + ": " + frame.value[i] : frame.label);
+                    }
+                }
+            };
+            return group;
+        })().addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, latitudes, longitudes, values=None, colors="blue", radii=5, label=None,
+                 tooltips=None, popups=None, stroke_color="blue", weight=0.5, fill_opacity=0.7, precision=5,
+                 frames=None, start=0, charts=None):
+        super().__init__()
+        self._name = "PointLayer"
+        latitudes = np.round(np.asarray(latitudes, dtype=float), precision)
+        longitudes = np.round(np.asarray(longitudes, dtype=float), precision)
+        n = len(latitudes)
+
+        # Une image par jour : valeurs, couleurs, rayons et libellé de chaque image
+        if frames is None:
+            frames = [{"values": values, "colors": colors, "radii": radii, "label": label}]
+        frame_colors = [np.broadcast_to(np.asarray(frame["colors"], dtype=object), (n,)).astype(str) for frame in frames]
+
+        # Palette + indices : chaque couleur n'est transmise qu'une seule fois
+        palette, color_index = np.unique(np.concatenate(frame_colors), return_inverse=True)
+        color_index = color_index.reshape(len(frames), n)
+
+        encoded = []
+        for frame, indices in zip(frames, color_index):
+            radii = np.atleast_1d(np.asarray(frame["radii"], dtype=float))
+            if radii.size > 1 and np.all(radii == radii[0]):
+                radii = radii[:1]
+            encoded.append({
+                "value": None if frame["values"] is None else np.round(np.asarray(frame["values"], dtype=float), 2).tolist(),
+                "color": indices.astype(int).tolist(),
+                "radius": radii.tolist(),
+                "label": frame["label"],
+            })
+
+        self.data = {
+            "lat": latitudes.tolist(),
+            "lon": longitudes.tolist(),
+            **encoded[start],
+            "palette": palette.tolist(),
+            "frames": encoded if len(encoded) > 1 else None,
+            "tooltip": None if tooltips is None else [str(t) for t in tooltips],
+            "popup": None if popups is None else [str(p) for p in popups],
+            "chart": charts,
+            "stroke": stroke_color,
+            "weight": weight,
+            "fill_opacity": fill_opacity,
+        }
+
+
+@timed("point_layer")
+def add_point_layer(carte, gdf, values=None, colors="blue", radii=5, label=None, tooltips=None, popups=None, **kwargs):
+    """
+    Ajoute les stations d'un GeoDataFrame à la carte en une seule couche.
+    :param carte: Carte Folium.
+    :param gdf: GeoDataFrame de points.
+    :param values: Valeurs affichées dans l'infobulle (tableau ou None).
+    :param colors: Couleur de remplissage (une couleur ou un tableau de couleurs).
+    :param radii: Rayon des cercles (un rayon ou un tableau de rayons).
+    :param label: Libellé de l'infobulle.
+    :param tooltips: Texte des infobulles par point (tableau ou None, prioritaire sur label).
+    :param popups: Contenu HTML des popups (tableau ou None).
+    :param charts: Séries des stations tracées dans le navigateur à l'ouverture
+        du popup (voir station_charts.chart_data), si popups n'est pas donné.
+    :return: La couche ajoutée.
+    """
+    layer = PointLayer(gdf.geometry.y.to_numpy(), gdf.geometry.x.to_numpy(), values=values, colors=colors,
+                       radii=radii, label=label, tooltips=tooltips, popups=popups, **kwargs)
+    layer.add_to(carte)
+    return layer
+
+
+@timed("point_layer")
+def add_point_frames(carte, gdf, frames, start=-1, **kwargs):
+    """
+    Ajoute les stations avec une image par jour : toutes les valeurs sont
+    envoyées une fois et le navigateur change de jour sans rerun (voir DayControl).
+    :param carte: Carte Folium.
+    :param gdf: GeoDataFrame de points.
+    :param frames: Liste de dictionnaires {"values", "colors", "radii", "label"}, un par jour.
+    :param start: Indice de l'image affichée au chargement.
+    :return: La couche ajoutée.
+    """
+    layer = PointLayer(gdf.geometry.y.to_numpy(), gdf.geometry.x.to_numpy(), frames=frames,
+                       start=range(len(frames))[start], **kwargs)
+    layer.add_to(carte)
+    return layer
+
+
+class FrameLayer(MacroElement):
+    """
+    Raster avec une image par jour : images PNG (ImageOverlay) ou modèles
+    d'URL de tuiles (TileLayer), toutes envoyées au chargement de la carte.
+    Le navigateur change de jour en changeant l'URL de la couche.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data|tojson }};
+            var layer = data.bounds
+                ? L.imageOverlay(data.urls[data.start], data.bounds[data.start], {opacity: data.opacity})
+                : L.tileLayer(data.urls[data.start], {opacity: data.opacity, attribution: data.attr});
+            // Préchargement des images pour un changement de jour immédiat
+            if (data.bounds) {
+                data.urls.forEach(function(url) { new Image().src = url; });
+            }
+            layer.setFrame = function(k) {
+                layer.setUrl(data.urls[k]);
+                if (data.bounds) {
+                    layer.setBounds(L.latLngBounds(data.bounds[k]));
+                }
+            };
+            return layer;
+        })().addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, urls, bounds=None, opacity=1, attr="", start=-1):
+        super().__init__()
+        self._name = "FrameLayer"
+        if bounds is not None and not isinstance(bounds[0][0], (list, tuple)):
+            bounds = [bounds] * len(urls)
+        self.data = {"urls": list(urls), "bounds": bounds, "opacity": opacity, "attr": attr, "start": range(len(urls))[start]}
+
+    def _get_self_bounds(self):
+        # Emprise de toutes les images (utilisée par fit_bounds et st_folium)
+        if self.data["bounds"] is None:
+            return [[None, None], [None, None]]
+        corners = np.array(self.data["bounds"], dtype=float)
+        return [corners[:, 0].min(axis=0).tolist(), corners[:, 1].max(axis=0).tolist()]
+
+
+class DayControl(MacroElement):
+    """
+    Contrôle de lecture des jours (lecture/pause et curseur) exécuté dans le
+    navigateur : il appelle setFrame(k) sur chaque couche animée.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var labels = {{ this.labels|tojson }};
+            var layers = [{% for layer in this.layers %}{{ layer.get_name() }}{% if not loop.last %}, {% endif %}{% endfor %}];
+            var frame = {{ this.start }};
+            var timer = null;
+            var control = L.control({position: {{ this.position|tojson }}});
+            control.onAdd = function() {
+                var div = L.DomUtil.create("div", "leaflet-bar");
+                div.style.cssText = "background: white; padding: 4px 8px; display: flex; align-items: center; gap: 6px; font: 12px sans-serif;";
+                div.innerHTML = '<a href="#" role="button" style="width: 20px; height: 20px; line-height: 20px;">&#9654;</a>'
+                    + '<input type="range" min="0" max="' + (labels.length - 1) + '" step="1" style="width: 140px;">'
+                    + '<span style="min-width: 80px;"></span>';
+                var button = div.querySelector("a"), slider = div.querySelector("input"), label = div.querySelector("span");
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+
+                function show(k) {
+                    frame = k;
+                    slider.value = k;
+                    label.textContent = labels[k];
+                    layers.forEach(function(layer) { layer.setFrame(k); });
+                }
+                function pause() {
+                    clearInterval(timer);
+                    timer = null;
+                    button.innerHTML = "&#9654;";
+                }
+                slider.addEventListener("input", function() { pause(); show(parseInt(slider.value)); });
+                L.DomEvent.on(button, "click", function(e) {
+                    L.DomEvent.preventDefault(e);
+                    if (timer !== null) {
+                        pause();
+                        return;
+                    }
+                    button.innerHTML = "&#10074;&#10074;";
+                    timer = setInterval(function() { show((frame + 1) % labels.length); }, {{ this.interval }});
+                });
+                show(frame);
+                return div;
+            };
+            return control;
+        })().addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, layers, labels, start=-1, interval=1000, position="bottomright"):
+        super().__init__()
+        self._name = "DayControl"
+        self.layers = layers
+        self.labels = list(labels)
+        self.start = range(len(self.labels))[start]
+        self.interval = int(interval)
+        self.position = position
+
+
+def add_day_control(carte, layers, labels, start=-1, interval=1000):
+    """
+    Ajoute le contrôle de lecture des jours, après les couches animées.
+    :param carte: Carte Folium.
+    :param layers: Couches avec une image par jour (PointLayer, FrameLayer).
+    :param labels: Libellé de chaque jour.
+    :param start: Indice du jour affiché au chargement.
+    :param interval: Durée d'affichage d'un jour pendant la lecture, en millisecondes.
+    :return: Le contrôle ajouté.
+    """
+    control = DayControl(layers, labels, start, interval)
+    control.add_to(carte)
+    return control
+
+
+def render_map(carte):
+    """
+    Rend une carte Folium en page HTML complète (comme folium_static), avec les
+    ressources Leaflet et plugins copiées en local si elles l'ont été (map_assets).
+    :param carte: Carte Folium.
+    :return: HTML de la carte.
+    """
+    figure = folium.Figure().add_child(carte)
+    with span("map_render"):
+        return localize_html(figure.render())
+
+
+def _display(html, width, height):
+    record_payload("map_html", len(html.encode()))
+    components.html(html, height=height + 10, width=width)
+
+
+def show_map(carte, width=700, height=500):
+    """
+    Affiche une carte Folium statique (comme folium_static) en mesurant le
+    rendu HTML et la taille envoyée au navigateur.
+    :param carte: Carte Folium.
+    :param width: Largeur du composant.
+    :param height: Hauteur du composant.
+    """
+    _display(render_map(carte), width, height)
+
+
+class MapCache:
+    """
+    Cache LRU des cartes rendues, borné en octets, partagé par toutes les sessions.
+    """
+
+    def __init__(self, max_bytes, compress=True):
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: HTML de la carte, ou None si la clé est absente.
+        """
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                return None
+            self._entries.move_to_end(key)
+        return (zlib.decompress(content) if self.compress else content).decode()
+
+    def put(self, key, html):
+        content = html.encode()
+        if self.compress:
+            content = zlib.compress(content, 1)
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = content
+            self.size += len(content)
+            # Éviction des cartes les moins récemment affichées
+            while self.size > self.max_bytes:
+                self.size -= len(self._entries.popitem(last=False)[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_map_cache():
+    return MapCache(int(MAP_CACHE_MB * 2 ** 20), MAP_CACHE_COMPRESS)
+
+
+def _tile_server_url():
+    # Adresse des tuiles inscrite dans la carte : elle dépend de l'hôte de la page
+    from tile_server import TILES_ENABLED, public_url  # import local : tile_server dépend de map_layers
+    return public_url() if TILES_ENABLED else None
+
+
+def show_cached_map(key, build, width=700, height=500):
+    """
+    Affiche une carte rendue depuis le cache partagé : build() n'est appelé, et la
+    carte rendue en HTML, que si la clé est absente. La clé contient la page, toutes
+    les entrées qui changent la carte et la version des données (station_version,
+    dates de modification des rasters) ; l'adresse du serveur de tuiles vue par le
+    navigateur et la version des ressources et des plugins (map_assets) y sont
+    ajoutées. Une nouvelle version donne une nouvelle clé et les anciennes cartes
+    sortent du cache par éviction.
+    :param key: Tuple hachable (page, entrées..., version des données).
+    :param build: Fonction sans argument qui construit la carte Folium.
+    :param width: Largeur du composant.
+    :param height: Hauteur du composant.
+    """
+    if MAP_CACHE_MB <= 0:
+        show_map(build(), width, height)
+        return
+    cache = get_map_cache()
+    key = (*key, _tile_server_url(), asset_version())
+    with span("map_cache_lookup"):
+        html = cache.get(key)
+    REGISTRY.increment("clima_map_cache_total", (("page", str(key[0])), ("result", "miss" if html is None else "hit")))
+    if html is None:
+        html = render_map(build())
+        cache.put(key, html)
+    _display(html, width, height)
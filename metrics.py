@@ -0,0 +1,223 @@
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from profiling import StackSampler, profile_download, profile_requested, save_profile
+
+# Mesures de performance : durées des étapes (lecture Parquet, décodage WKB,
+# couches de points, rendu des cartes, lecture et encodage des rasters), durée
+# de chaque rerun par page et taille du HTML envoyé au navigateur.
+# CLIMA_DEBUG=1 (ou ?debug=1 dans l'URL) affiche le panneau de mesures dans la
+# barre latérale ; CLIMA_METRICS_FILE=chemin écrit l'export Prometheus après
+# chaque rerun ; CLIMA_METRICS_ENDPOINT=1 le sert sur /metrics du serveur de tuiles.
+DEBUG_ENABLED = os.environ.get("CLIMA_DEBUG", "0") == "1"
+METRICS_FILE = os.environ.get("CLIMA_METRICS_FILE")
+METRICS_ENDPOINT = os.environ.get("CLIMA_METRICS_ENDPOINT", "0") == "1"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+
+# Reruns gardés par session pour le panneau de mesures
+SESSION_HISTORY = 20
+
+METRICS = {
+    "clima_span_seconds": ("Durée des étapes instrumentées", SECONDS_BUCKETS),
+    "clima_rerun_seconds": ("Durée d'un rerun complet d'une page", SECONDS_BUCKETS),
+    "clima_payload_bytes": ("Taille du HTML des cartes envoyé au navigateur", BYTES_BUCKETS),
+    # Compteurs (sans seuils)
+    "clima_map_cache_total": ("Consultations du cache des cartes rendues", None),
+}
+
+
+class Registry:
+    """
+    Histogrammes et compteurs cumulés du processus, partagés par toutes les sessions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, metric, labels, value):
+        """
+        Ajoute une observation à l'histogramme d'une métrique.
+        :param metric: Nom de la métrique (clé de METRICS).
+        :param labels: Tuple de paires (nom, valeur).
+        :param value: Valeur observée.
+        """
+        buckets = METRICS[metric][1]
+        with self._lock:
+            series = self._series.setdefault((metric, labels), {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def increment(self, metric, labels, value=1):
+        """
+        Incrémente un compteur.
+        :param metric: Nom de la métrique (clé de METRICS, sans seuils).
+        :param labels: Tuple de paires (nom, valeur).
+        :param value: Incrément.
+        """
+        with self._lock:
+            series = self._series.setdefault((metric, labels), {"buckets": [], "sum": 0.0, "count": 0})
+            series["count"] += value
+
+    def prometheus_text(self):
+        """
+        Export au format texte de Prometheus.
+        :return: Texte de l'export.
+        """
+        with self._lock:
+            series = {key: {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]} for key, value in self._series.items()}
+        lines = []
+        for metric, (description, buckets) in METRICS.items():
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {'counter' if buckets is None else 'histogram'}"]
+            for (name, labels), value in sorted(series.items()):
+                if name != metric:
+                    continue
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                if buckets is None:
+                    lines.append(f"{metric}{{{label_text}}} {value['count']}")
+                    continue
+                for bound, count in zip(buckets, value["buckets"]):
+                    lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {value["count"]}')
+                lines.append(f"{metric}_sum{{{label_text}}} {value['sum']:.6f}")
+                lines.append(f"{metric}_count{{{label_text}}} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+# Rerun en cours dans le thread du script (Streamlit exécute chaque session dans son thread)
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Mesure la durée d'une étape, pour le rerun en cours et pour l'export.
+    :param name: Nom de l'étape (ex. "parquet_read").
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe("clima_span_seconds", (("span", name),), elapsed)
+        record = getattr(_local, "rerun", None)
+        if record is not None:
+            record["spans"].append((name, elapsed))
+
+
+def timed(name):
+    """
+    Décorateur : mesure chaque appel de la fonction comme l'étape name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_payload(name, size):
+    """
+    Enregistre la taille d'un contenu envoyé au navigateur.
+    :param name: Nom du contenu (ex. "map_html").
+    :param size: Taille en octets.
+    """
+    record = getattr(_local, "rerun", None)
+    page = record["page"] if record is not None else ""
+    REGISTRY.observe("clima_payload_bytes", (("page", page), ("payload", name)), size)
+    if record is not None:
+        record["payloads"].append((name, size))
+
+
+def write_prometheus(path=METRICS_FILE):
+    """
+    Écrit l'export Prometheus dans un fichier (collecteur textfile de node_exporter).
+    :param path: Chemin du fichier.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.prometheus_text())
+    os.replace(tmp, path)
+
+
+def debug_enabled():
+    return DEBUG_ENABLED or st.query_params.get("debug") == "1"
+
+
+@contextlib.contextmanager
+def page_rerun(page):
+    """
+    Mesure un rerun d'une page : durée totale, étapes et tailles des contenus.
+    Le panneau de mesures est affiché à la fin si le mode debug est activé, et
+    le rerun est profilé si un profil est demandé (voir profiling.py).
+    :param page: Nom court de la page (libellé Prometheus).
+    """
+    if METRICS_ENDPOINT:
+        from tile_server import start_tile_server
+        start_tile_server()
+
+    record = {"page": page, "time": pd.Timestamp.now(), "spans": [], "payloads": []}
+    _local.rerun = record
+    sampler = StackSampler().start() if profile_requested() else None
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        # st.stop() et st.rerun() passent par ici : le rerun est mesuré sans afficher le panneau
+        record["seconds"] = time.perf_counter() - start
+        if sampler is not None:
+            profile = save_profile(sampler.stop(), page)
+        _local.rerun = None
+        REGISTRY.observe("clima_rerun_seconds", (("page", page),), record["seconds"])
+        history = st.session_state.setdefault("_metrics_history", collections.deque(maxlen=SESSION_HISTORY))
+        history.append(record)
+        if METRICS_FILE:
+            write_prometheus(METRICS_FILE)
+    if sampler is not None:
+        profile_download(*profile, sampler.duration)
+    if debug_enabled():
+        debug_panel(record, history)
+
+
+def debug_panel(record, history):
+    """
+    Panneau de mesures dans la barre latérale : étapes du dernier rerun,
+    tailles envoyées, historique des reruns de la session et export Prometheus.
+    """
+    with st.sidebar.expander("⏱️ Mesures de performance", expanded=True):
+        st.metric("Dernier rerun", f"{record['seconds'] * 1000:.0f} ms")
+        if record["spans"]:
+            spans = pd.DataFrame(record["spans"], columns=["étape", "secondes"])
+            spans = spans.groupby("étape", sort=False)["secondes"].agg(appels="count", total="sum").sort_values("total", ascending=False)
+            spans["total (ms)"] = (spans.pop("total") * 1000).round(1)
+            st.dataframe(spans)
+        for name, size in record["payloads"]:
+            st.caption(f"{name} : {size / 1024:.0f} Ko")
+
+        st.markdown("**Reruns de la session**")
+        st.dataframe(pd.DataFrame(
+            [(item["time"].strftime("%H:%M:%S"), item["page"], round(item["seconds"] * 1000), sum(size for _, size in item["payloads"]) // 1024)
+             for item in reversed(history)],
+            columns=["heure", "page", "durée (ms)", "HTML (Ko)"],
+        ), hide_index=True)
+        st.download_button("Export Prometheus", REGISTRY.prometheus_text(), file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from scipy.spatial import cKDTree
+
+from data_access import load_stations, station_version
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(latitudes, longitudes):
+    """
+    Convertit des coordonnées en vecteurs unitaires 3D : la distance euclidienne
+    (corde) entre deux vecteurs croît avec la distance haversine.
+    :return: Tableau (n, 3).
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+class NearestStations:
+    """
+    Recherche des stations les plus proches par KD-tree sur la sphère.
+    """
+
+    def __init__(self, gdf):
+        self.gdf = gdf
+        self.tree = cKDTree(to_unit_vectors(gdf.geometry.y.to_numpy(), gdf.geometry.x.to_numpy()))
+
+    def query(self, latitudes, longitudes, k=5):
+        """
+        Les k stations les plus proches de chaque point, en une seule requête vectorisée.
+        :param latitudes: Latitudes des points recherchés.
+        :param longitudes: Longitudes des points recherchés.
+        :param k: Nombre de stations par point.
+        :return: Tuple (distances en km, positions des stations), tableaux (n, k).
+        """
+        k = min(k, len(self.gdf))
+        chord, positions = self.tree.query(to_unit_vectors(latitudes, longitudes), k=k)
+        chord, positions = chord.reshape(-1, k), positions.reshape(-1, k)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+        return distances, positions
+
+    def results(self, latitudes, longitudes, k=5, columns=()):
+        """
+        Tableau des stations les plus proches, une ligne par (point, rang).
+        :param latitudes: Latitudes des points recherchés.
+        :param longitudes: Longitudes des points recherchés.
+        :param k: Nombre de stations par point.
+        :param columns: Colonnes des stations à joindre au résultat.
+        :return: DataFrame.
+        """
+        distances, positions = self.query(latitudes, longitudes, k)
+        n, k = positions.shape
+        flat = positions.ravel()
+        table = pd.DataFrame({
+            "point": np.repeat(np.arange(n), k),
+            "latitude": np.repeat(np.asarray(latitudes, dtype=float), k),
+            "longitude": np.repeat(np.asarray(longitudes, dtype=float), k),
+            "rang": np.tile(np.arange(1, k + 1), n),
+            "distance_km": distances.ravel().round(3),
+            "position": flat,
+        })
+        stations = self.gdf.iloc[flat][list(columns)].reset_index(drop=True)
+        return pd.concat([table, stations], axis=1)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _build_nearest_index(date, version):
+    return NearestStations(load_stations(date))
+
+
+def get_nearest_index(date=None):
+    """
+    Retourne l'index des plus proches stations, construit une seule fois par date et par version des données.
+    :param date: Date des observations, ou None pour la plus récente.
+    :return: NearestStations.
+    """
+    return _build_nearest_index(*station_version(date))
+
+
+def parse_coordinates(text):
+    """
+    Lit une liste de coordonnées collée, une paire 'latitude, longitude' par ligne.
+    :param text: Texte saisi.
+    :return: Tuple (latitudes, longitudes).
+    """
+    rows = [line.replace(";", ",").split(",") for line in text.splitlines() if line.strip()]
+    values = np.array([[float(row[0]), float(row[1])] for row in rows], dtype=float).reshape(-1, 2)
+    return values[:, 0], values[:, 1]
+
+
+def read_coordinates_csv(file):
+    """
+    Lit un fichier CSV de coordonnées (colonnes latitude/longitude ou lat/lon).
+    :param file: Fichier CSV.
+    :return: Tuple (latitudes, longitudes).
+    """
+    table = pd.read_csv(file)
+    columns = {column.lower(): column for column in table.columns}
+    latitude = columns.get("latitude", columns.get("lat"))
+    longitude = columns.get("longitude", columns.get("lon", columns.get("lng")))
+    if latitude is None or longitude is None:
+        raise ValueError("Le fichier CSV doit contenir les colonnes 'latitude' et 'longitude'.")
+    return table[latitude].to_numpy(dtype=float), table[longitude].to_numpy(dtype=float)
@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from data_access import load_stations, station_version
+
+# Colonnes journalières du Parquet des stations, de J0 à J-6 (noms d'origine).
+# Seule la construction du magasin les lit : les pages passent par ObservationStore.select.
+WIDE_COLUMNS = {
+    "prec": ["PRECIPITATJ0", "PRECIPITJ_1", "PRECIPITJ_2", "PRECIPITJ_3", "PRECIPITJ_4", "PRECIPITJ_5", "PRECIPITJ_6"],
+    "temp": ["TEMPERATURJ0", "TEMPERATJ_1", "TEMPERATJ_2", "TEMPERATJ_3", "TEMPERATJ_4", "TEMPERATJ_5", "TEMPERATJ_6"],
+    "hum": ["HUMIDITEJ0", "HUMIDITEJ_1", "HUMIDITEJ_2", "HUMIDITEJ_3", "HUMIDITEJ_4", "HUMIDITEJ_5", "HUMIDITEJ_6"],
+}
+
+# Libellés des variables dans les pages
+VARIABLE_LABELS = {"prec": "Précipitation", "temp": "Température", "hum": "Humidité"}
+
+# Observations au format long : une ligne par (station, variable, jour),
+# un fichier par date des stations
+OBSERVATION_DIR = "observations"
+
+SCHEMA = pa.schema([
+    ("station_id", pa.int64()),
+    ("region", pa.dictionary(pa.int16(), pa.string())),
+    ("variable", pa.dictionary(pa.int8(), pa.string())),
+    ("day", pa.int16()),
+    ("value", pa.float32()),
+])
+
+
+def wide_column(variable, day_offset):
+    """
+    Nom de la colonne du Parquet des stations pour une variable et un jour.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :return: Nom de la colonne (ex. "TEMPERATJ_3").
+    """
+    return WIDE_COLUMNS[variable][-day_offset]
+
+
+def day_label(day):
+    """
+    Libellé d'un jour relatif à la date des stations.
+    :param day: Décalage du jour (ex. -3).
+    :return: Libellé (ex. "J-3", "J0").
+    """
+    return f"J{int(day)}"
+
+
+def to_long_table(df, id_column="FID_1", region_column="Nom_Region"):
+    """
+    Convertit les colonnes journalières en table longue (station_id, region, variable, day, value),
+    triée par variable, station puis jour.
+    :param df: DataFrame au format large.
+    :return: Table Arrow.
+    """
+    station_ids = df[id_column].to_numpy(dtype=np.int64)
+    regions = df[region_column].to_numpy(dtype=object)
+    n_days = len(next(iter(WIDE_COLUMNS.values())))
+    columns = {name: [] for name in SCHEMA.names}
+    for variable, wide in WIDE_COLUMNS.items():
+        # (stations, jours) avec les jours dans l'ordre croissant : J-6 ... J0
+        values = df[wide[::-1]].to_numpy(dtype=np.float32)
+        columns["station_id"].append(np.repeat(station_ids, n_days))
+        columns["region"].append(np.repeat(regions, n_days))
+        columns["variable"].append(np.full(values.size, variable, dtype=object))
+        columns["day"].append(np.tile(np.arange(-(n_days - 1), 1, dtype=np.int16), len(station_ids)))
+        columns["value"].append(values.ravel())
+
+    table = pa.table({name: pa.array(np.concatenate(parts)) for name, parts in columns.items()})
+    table = table.sort_by([("variable", "ascending"), ("station_id", "ascending"), ("day", "ascending")])
+    # Colonnes région et variable encodées en dictionnaire
+    return pa.table({name: table[name].dictionary_encode() if pa.types.is_dictionary(field.type) else table[name]
+                     for name, field in zip(SCHEMA.names, SCHEMA)}).cast(SCHEMA)
+
+
+def build_observation_store(date, path):
+    """
+    Écrit le Parquet long à partir des stations d'une date.
+    :param date: Date des observations, ou None pour la plus récente.
+    :param path: Parquet de sortie.
+    :return: Chemin du fichier écrit.
+    """
+    columns = ["FID_1", "Nom_Region"] + [column for wide in WIDE_COLUMNS.values() for column in wide]
+    table = to_long_table(load_stations(date, columns=columns))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+
+class ObservationStore:
+    """
+    Observations en mémoire : un tableau contigu (stations, jours) par variable.
+    """
+
+    def __init__(self, table):
+        stations = table["station_id"].to_numpy()
+        days = table["day"].to_numpy()
+        variables = table["variable"].combine_chunks()
+        values = table["value"].to_numpy()
+
+        self.station_ids = np.unique(stations)
+        self.days = np.unique(days)
+        regions = pd.Series(table["region"].to_pandas().to_numpy(), index=stations)
+        self.regions = pd.Categorical(regions[~regions.index.duplicated()].reindex(self.station_ids))
+
+        rows, cols = np.searchsorted(self.station_ids, stations), np.searchsorted(self.days, days)
+        codes = variables.indices.to_numpy()
+        self._matrices = {}
+        for code, variable in enumerate(variables.dictionary.to_pylist()):
+            selected = codes == code
+            matrix = np.full((len(self.station_ids), len(self.days)), np.nan, dtype=np.float32)
+            matrix[rows[selected], cols[selected]] = values[selected]
+            matrix.setflags(write=False)
+            self._matrices[variable] = matrix
+
+    @property
+    def variables(self):
+        return list(self._matrices)
+
+    def select(self, variable, days=None, stations=None):
+        """
+        Valeurs d'une variable sur une plage de jours, pour toutes les stations ou une sélection.
+        :param variable: Code de la variable (prec, temp, hum).
+        :param days: Tuple (premier, dernier) jour inclus, ou None pour tous les jours.
+        :param stations: Identifiants des stations, dans l'ordre voulu, ou None pour toutes.
+        :return: Tuple (jours, tableau contigu (stations, jours)).
+        """
+        matrix = self._matrices[variable]
+        first, last = (self.days[0], self.days[-1]) if days is None else days
+        day_slice = slice(np.searchsorted(self.days, first, side="left"), np.searchsorted(self.days, last, side="right"))
+        if stations is not None:
+            stations = np.asarray(stations, dtype=np.int64)
+            rows = np.searchsorted(self.station_ids, stations)
+            if (rows >= len(self.station_ids)).any() or (self.station_ids[np.minimum(rows, len(self.station_ids) - 1)] != stations).any():
+                raise KeyError("Stations inconnues dans la sélection.")
+            matrix = matrix[rows]
+        return self.days[day_slice], np.ascontiguousarray(matrix[:, day_slice])
+
+    def frame(self, stations, variables=None):
+        """
+        Valeurs journalières d'une sélection de stations en colonnes, de J0 au jour le plus ancien,
+        pour l'affichage (ex. "Précipitation J-3").
+        :param stations: Identifiants des stations, dans l'ordre voulu (doublons permis).
+        :param variables: Codes des variables, ou None pour toutes.
+        :return: DataFrame, une ligne par station demandée.
+        """
+        columns = {}
+        for variable in variables or self.variables:
+            days, values = self.select(variable, stations=stations)
+            for k in range(len(days) - 1, -1, -1):
+                columns[f"{VARIABLE_LABELS.get(variable, variable)} {day_label(days[k])}"] = values[:, k]
+        return pd.DataFrame(columns)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_observations(date, version):
+    path = os.path.join(OBSERVATION_DIR, f"{date or 'stations'}.parquet")
+    if not os.path.exists(path) or os.path.getmtime(path) < version[-1]:
+        build_observation_store(date, path)
+    return ObservationStore(pq.read_table(path))
+
+
+def load_observations(date=None):
+    """
+    Retourne le magasin d'observations d'une date, reconstruit si les stations ont changé.
+    :param date: Date des observations, ou None pour la plus récente.
+    :return: ObservationStore.
+    """
+    return _load_observations(*station_version(date))
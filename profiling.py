@@ -0,0 +1,127 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+import streamlit as st
+
+# Profil d'un rerun à la demande : ?profile=1 dans l'URL ou CLIMA_PROFILE=1.
+# Un thread échantillonne la pile du script toutes les SAMPLE_INTERVAL secondes ;
+# le profil est écrit au format speedscope (https://www.speedscope.app) et en
+# piles repliées (flamegraph.pl, inferno). Sans demande, rien n'est démarré.
+PROFILE_ENABLED = os.environ.get("CLIMA_PROFILE", "0") == "1"
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.002
+
+
+def profile_requested():
+    return PROFILE_ENABLED or st.query_params.get("profile") == "1"
+
+
+class StackSampler:
+    """
+    Profileur par échantillonnage de la pile d'un thread (sys._current_frames).
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.frames = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _frame_index(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        return self.frames.setdefault(key, len(self.frames))
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            # Pile de la racine vers la fonction en cours, pondérée par le temps écoulé
+            self.samples.append(stack[::-1])
+            self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def to_speedscope(self, name):
+        """
+        Profil au format speedscope (type "sampled").
+        :param name: Nom du profil.
+        :return: Dictionnaire sérialisable en JSON.
+        """
+        frames = sorted(self.frames.items(), key=lambda item: item[1])
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "Morocco Clima",
+            "shared": {"frames": [{"name": function, "file": file, "line": line} for (function, file, line), _ in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+        }
+
+    def to_folded(self):
+        """
+        Piles repliées "racine;...;feuille durée_en_microsecondes", une ligne par pile.
+        :return: Texte du profil.
+        """
+        names = {index: f"{function} ({os.path.basename(file)}:{line})" for (function, file, line), index in self.frames.items()}
+        totals = {}
+        for stack, weight in zip(self.samples, self.weights):
+            key = ";".join(names[index] for index in stack)
+            totals[key] = totals.get(key, 0) + weight
+        return "".join(f"{stack} {round(weight * 1e6)}\n" for stack, weight in totals.items())
+
+
+def save_profile(sampler, page, directory=PROFILE_DIR):
+    """
+    Écrit le profil d'un rerun dans profiles/ aux formats speedscope et piles repliées.
+    :param sampler: StackSampler arrêté.
+    :param page: Nom court de la page.
+    :return: Tuple (chemin du fichier speedscope, contenu JSON).
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"{page}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}"
+    content = json.dumps(sampler.to_speedscope(name))
+    path = os.path.join(directory, f"{name}.speedscope.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    with open(os.path.join(directory, f"{name}.folded"), "w", encoding="utf-8") as f:
+        f.write(sampler.to_folded())
+    return path, content
+
+
+def profile_download(path, content, duration):
+    """
+    Bouton de téléchargement du profil dans la barre latérale.
+    """
+    st.sidebar.caption(f"Profil du rerun ({duration:.2f} s) : {path}")
+    st.sidebar.download_button("Télécharger le profil (speedscope)", content, file_name=os.path.basename(path), mime="application/json")
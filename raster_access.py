@@ -0,0 +1,90 @@
+import os
+from collections import namedtuple
+
+import rasterio
+import streamlit as st
+
+from metrics import timed
+
+# Dossier des rasters climatiques journaliers : {variable}{day_offset}.tif
+RASTER_DIR = "cliptemp"
+
+# Jours disponibles : de J-6 à J0
+DAY_OFFSETS = range(-6, 1)
+
+# Code de fichier par type de donnée climatique
+VARIABLE_CODES = {
+    "Précipitation": "prec",
+    "Température": "temp",
+    "Humidité": "hum",
+}
+
+Raster = namedtuple("Raster", ["image", "bounds", "crs", "transform", "nodata"])
+
+
+def variable_code(column_type):
+    """
+    Retrouve le code de fichier d'un type de donnée, quel que soit son libellé
+    (ex. "🌧  Précipitation", "🌧 Précipitation" ou "Précipitation" -> "prec").
+    :param column_type: Libellé du type de donnée climatique.
+    :return: Code de la variable.
+    """
+    for label, code in VARIABLE_CODES.items():
+        if label in column_type:
+            return code
+    raise ValueError(f"Le type de colonne {column_type} n'est pas pris en charge.")
+
+
+def raster_path(variable, day_offset):
+    return os.path.join(RASTER_DIR, f"{variable}{day_offset}.tif")
+
+
+def raster_version(variable, day_offsets=DAY_OFFSETS):
+    """
+    Dates de modification des rasters d'une variable, pour les caches qui en dépendent.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offsets: Jours concernés.
+    :return: Tuple des dates de modification (None pour un raster absent).
+    """
+    return tuple(
+        os.path.getmtime(raster_path(variable, day_offset)) if os.path.exists(raster_path(variable, day_offset)) else None
+        for day_offset in day_offsets
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _read_raster(variable, day_offset, mtime):
+    """
+    Lit la première bande d'un raster et referme immédiatement le fichier.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :param mtime: Date de modification du fichier (clé de cache uniquement).
+    :return: Raster.
+    """
+    with rasterio.open(raster_path(variable, day_offset)) as src:
+        img = src.read(1)
+        raster = Raster(img, src.bounds, src.crs, src.transform, src.nodata)
+
+    # Le tableau est partagé entre les sessions : lecture seule
+    img.setflags(write=False)
+    return raster
+
+
+@timed("raster_read")
+def load_raster(variable, day_offset):
+    """
+    Retourne le raster d'une variable pour un jour donné.
+    Si le cube (voir datacube.py) est à jour, l'image est une tranche en mémoire
+    mappée, sans décodage. Sinon les tableaux décodés sont gardés dans un cache
+    LRU borné, invalidé dès que le fichier est modifié sur le disque.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :return: Raster (image, bounds, crs, transform, nodata).
+    """
+    from datacube import open_datacube  # import local : datacube dépend de ce module
+
+    mtime = os.path.getmtime(raster_path(variable, day_offset))
+    cube = open_datacube()
+    if cube is not None and cube.is_current(variable, day_offset, mtime):
+        return Raster(cube.day(variable, day_offset), cube.bounds, cube.crs, cube.transform, cube.nodata(variable, day_offset))
+    return _read_raster(variable, day_offset, mtime)
@@ -0,0 +1,158 @@
+import datetime
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import rasterio
+import streamlit as st
+from rasterio.coords import BoundingBox
+
+from cog_convert import COG_DIR, cog_name
+from data_access import available_dates
+from raster_access import DAY_OFFSETS, RASTER_DIR, VARIABLE_CODES, raster_path
+
+# Index des rasters (à la manière d'un catalogue STAC) : une entrée par
+# variable et par jour avec la géoréférence, les statistiques et les aperçus.
+CATALOG_PATH = os.path.join(RASTER_DIR, "catalog.json")
+PERCENTILES = (2, 50, 98)
+
+
+def _base_date():
+    # Date J0 des rasters : date des observations les plus récentes des stations
+    return pd.Timestamp(available_dates()[-1]).date()
+
+
+def _signature(path):
+    return [os.path.getmtime(path), os.path.getsize(path)] if os.path.exists(path) else None
+
+
+def _describe(variable, day_offset, base_date):
+    """
+    Lit une seule fois un raster pour en décrire la géoréférence et les valeurs.
+    :return: Entrée du catalogue.
+    """
+    path = raster_path(variable, day_offset)
+    with rasterio.open(path) as src:
+        values = src.read(1, masked=True).compressed().astype(np.float64)
+        values = values[np.isfinite(values)]
+        entry = {
+            "variable": variable,
+            "day_offset": day_offset,
+            "date": (base_date + datetime.timedelta(days=day_offset)).isoformat(),
+            "path": path,
+            "signature": _signature(path),
+            "bounds": list(src.bounds),
+            "crs": src.crs.to_string(),
+            "width": src.width,
+            "height": src.height,
+            "dtype": src.dtypes[0],
+            "nodata": src.nodata,
+            "overviews": src.overviews(1),
+            "min": float(values.min()) if values.size else None,
+            "max": float(values.max()) if values.size else None,
+            "mean": float(values.mean()) if values.size else None,
+            "percentiles": dict(zip(map(str, PERCENTILES), np.percentile(values, PERCENTILES).tolist())) if values.size else {},
+        }
+
+    cog_path = os.path.join(COG_DIR, cog_name(variable, day_offset))
+    entry["cog"] = None
+    if os.path.exists(cog_path):
+        with rasterio.open(cog_path) as cog:
+            entry["cog"] = {"path": cog_path, "signature": _signature(cog_path), "overviews": cog.overviews(1), "bytes": os.path.getsize(cog_path)}
+    return entry
+
+
+def _is_current(entry, variable, day_offset):
+    cog_path = os.path.join(COG_DIR, cog_name(variable, day_offset))
+    cog_signature = entry["cog"]["signature"] if entry.get("cog") else None
+    return entry.get("signature") == _signature(raster_path(variable, day_offset)) and cog_signature == _signature(cog_path)
+
+
+def build_catalog(path=CATALOG_PATH):
+    """
+    Met à jour le catalogue : seuls les rasters ajoutés ou modifiés depuis
+    la dernière construction sont relus.
+    :param path: Chemin du fichier JSON.
+    :return: Catalogue {clé: entrée}.
+    """
+    catalog = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            catalog = json.load(f)
+
+    changed, base_date = False, None
+    current = {}
+    for variable in VARIABLE_CODES.values():
+        for day_offset in DAY_OFFSETS:
+            key = f"{variable}{day_offset}"
+            if not os.path.exists(raster_path(variable, day_offset)):
+                continue
+            if key in catalog and _is_current(catalog[key], variable, day_offset):
+                current[key] = catalog[key]
+                continue
+            base_date = base_date or _base_date()
+            current[key] = _describe(variable, day_offset, base_date)
+            changed = True
+
+    if changed or current.keys() != catalog.keys():
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        os.replace(tmp, path)
+    return current
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_catalog(path, signatures):
+    return build_catalog(path)
+
+
+def load_catalog(path=CATALOG_PATH):
+    """
+    Retourne le catalogue, reconstruit uniquement si un raster a changé
+    (la vérification se limite à un stat() par fichier).
+    :param path: Chemin du fichier JSON.
+    :return: Catalogue {clé: entrée}.
+    """
+    signatures = tuple(
+        (tuple(_signature(raster_path(variable, day_offset)) or ()), tuple(_signature(os.path.join(COG_DIR, cog_name(variable, day_offset))) or ()))
+        for variable in VARIABLE_CODES.values()
+        for day_offset in DAY_OFFSETS
+    )
+    return _load_catalog(path, signatures)
+
+
+def raster_info(variable, day_offset):
+    """
+    Métadonnées d'un raster sans ouvrir le fichier.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :return: Entrée du catalogue.
+    """
+    try:
+        return load_catalog()[f"{variable}{day_offset}"]
+    except KeyError:
+        raise FileNotFoundError(f"Aucun raster pour {variable} {day_offset}") from None
+
+
+def raster_bounds(variable, day_offset):
+    """
+    Emprise d'un raster depuis le catalogue.
+    :return: BoundingBox (left, bottom, right, top).
+    """
+    return BoundingBox(*raster_info(variable, day_offset)["bounds"])
+
+
+def legend_range(variable):
+    """
+    Plage de légende commune aux 7 jours d'une variable : minimum et maximum
+    observés, arrondis à l'entier.
+    :param variable: Code de la variable (prec, temp, hum).
+    :return: Tuple (vmin, vmax).
+    """
+    entries = [entry for entry in load_catalog().values() if entry["variable"] == variable and entry["min"] is not None]
+    if not entries:
+        raise FileNotFoundError(f"Aucun raster pour {variable}")
+    return math.floor(min(entry["min"] for entry in entries)), math.ceil(max(entry["max"] for entry in entries))
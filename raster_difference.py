@@ -0,0 +1,119 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from raster_access import load_raster, raster_path
+from raster_overlay import encode_overlay
+
+# Palette divergente : bleu pour une baisse, rouge pour une hausse
+DIFFERENCE_COLORMAP = "RdBu_r"
+HISTOGRAM_BINS = 30
+TOP_PIXELS = 10
+
+Difference = namedtuple("Difference", ["delta", "percent", "bounds", "stats", "top", "histogram"])
+
+
+def _valid_values(raster):
+    image = np.asarray(raster.image, dtype=np.float32)
+    valid = np.isfinite(image)
+    if raster.nodata is not None:
+        valid &= image != raster.nodata
+    return np.where(valid, image, np.nan)
+
+
+def difference_from_rasters(raster_1, raster_2, day_offset_1, day_offset_2):
+    """
+    Écart raster_1 - raster_2, variation en pourcentage et statistiques, en une passe.
+    :param raster_1: Raster du premier jour.
+    :param raster_2: Raster du deuxième jour (même grille).
+    :param day_offset_1: Premier jour, pour les libellés.
+    :param day_offset_2: Deuxième jour, pour les libellés.
+    :return: Difference.
+    """
+    image_1, image_2 = _valid_values(raster_1), _valid_values(raster_2)
+
+    delta = image_1 - image_2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(image_2 != 0, delta / np.abs(image_2) * 100, np.nan)
+    delta.setflags(write=False)
+    percent.setflags(write=False)
+
+    valid = np.isfinite(delta)
+    values = delta[valid]
+    stats = {
+        "mean": float(values.mean()) if values.size else np.nan,
+        "mean_percent": float(np.nanmean(percent)) if np.isfinite(percent).any() else np.nan,
+        "min": float(values.min()) if values.size else np.nan,
+        "max": float(values.max()) if values.size else np.nan,
+        "pixels": int(values.size),
+    }
+
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    histogram = pd.DataFrame({"écart": (edges[:-1] + edges[1:]) / 2, "pixels": counts})
+
+    # Pixels de plus forte variation (en valeur absolue) et leurs coordonnées
+    flat = np.flatnonzero(valid)
+    order = flat[np.argsort(-np.abs(delta.ravel()[flat]))[:TOP_PIXELS]]
+    rows, cols = np.unravel_index(order, delta.shape)
+    longitudes, latitudes = raster_1.transform * (cols + 0.5, rows + 0.5)
+    top = pd.DataFrame({
+        "latitude": np.round(latitudes, 4),
+        "longitude": np.round(longitudes, 4),
+        f"jour {day_offset_1}": image_1[rows, cols],
+        f"jour {day_offset_2}": image_2[rows, cols],
+        "écart": delta[rows, cols],
+        "variation (%)": percent[rows, cols],
+    })
+
+    return Difference(delta, percent, raster_1.bounds, stats, top, histogram)
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _compute_difference(variable, day_offset_1, day_offset_2, mtimes):
+    return difference_from_rasters(load_raster(variable, day_offset_1), load_raster(variable, day_offset_2), day_offset_1, day_offset_2)
+
+
+def compute_difference(variable, day_offset_1, day_offset_2):
+    """
+    Écart jour 1 - jour 2 et variation en pourcentage d'une variable, calculés
+    sur les tableaux en cache avec leurs statistiques (moyenne, histogramme,
+    pixels les plus modifiés). Mis en cache par (variable, paire de jours).
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset_1: Premier jour (-6 à 0).
+    :param day_offset_2: Deuxième jour (-6 à 0).
+    :return: Difference (delta, percent, bounds, stats, top, histogram).
+    """
+    mtimes = tuple(os.path.getmtime(raster_path(variable, day)) for day in (day_offset_1, day_offset_2))
+    return _compute_difference(variable, day_offset_1, day_offset_2, mtimes)
+
+
+def difference_range(values):
+    """
+    Plage symétrique de la légende divergente (98e centile des écarts absolus).
+    :param values: Tableau des écarts.
+    :return: Borne positive de la légende.
+    """
+    finite = np.abs(values[np.isfinite(values)])
+    limit = float(np.percentile(finite, 98)) if finite.size else 0.0
+    return limit if limit > 0 else 1.0
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _difference_overlay(variable, day_offset_1, day_offset_2, mode, mtimes):
+    difference = _compute_difference(variable, day_offset_1, day_offset_2, mtimes)
+    values = difference.percent if mode == "percent" else difference.delta
+    limit = min(difference_range(values), 100.0) if mode == "percent" else difference_range(values)
+    return encode_overlay(values, -limit, limit, DIFFERENCE_COLORMAP), limit
+
+
+def difference_overlay(variable, day_offset_1, day_offset_2, mode="delta"):
+    """
+    Image PNG de l'écart (ou de la variation en %) sur une palette divergente centrée sur 0.
+    :param mode: "delta" pour l'écart, "percent" pour la variation en pourcentage.
+    :return: Tuple (URL de données PNG, borne de la légende).
+    """
+    mtimes = tuple(os.path.getmtime(raster_path(variable, day)) for day in (day_offset_1, day_offset_2))
+    return _difference_overlay(variable, day_offset_1, day_offset_2, mode, mtimes)
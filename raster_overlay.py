@@ -0,0 +1,106 @@
+import base64
+import io
+import os
+
+import numpy as np
+import streamlit as st
+from matplotlib import colormaps
+from PIL import Image
+
+from metrics import timed
+from raster_access import load_raster, raster_path
+from raster_catalog import legend_range
+
+# Niveau zlib des PNG, encodés à chaque affichage : optimize donnait des
+# fichiers ~20 % plus petits mais 15 à 30 fois plus lents
+PNG_COMPRESS_LEVEL = 3
+
+
+def get_lut(colormap="blue"):
+    """
+    Table de correspondance (256, 4) uint8 d'une palette.
+    "blue" reproduit la rampe transparent -> bleu des cartes ; les autres
+    noms sont des palettes matplotlib (ex. "Blues", "Reds", "Greens").
+    :param colormap: Nom de la palette.
+    :return: Tableau NumPy (256, 4) uint8.
+    """
+    if colormap == "blue":
+        lut = np.zeros((256, 4), dtype=np.uint8)
+        lut[:, 2] = 255
+        lut[:, 3] = np.arange(256)
+        return lut
+    return colormaps[colormap](np.linspace(0, 1, 256), bytes=True)
+
+
+def colorize(image, vmin, vmax, colormap="blue", nodata=None):
+    """
+    Normalise une image sur [vmin, vmax] et applique la palette en une seule opération.
+    Les pixels nodata ou non finis sont transparents.
+    :param image: Tableau 2D des valeurs.
+    :param vmin: Valeur minimale de la légende.
+    :param vmax: Valeur maximale de la légende.
+    :param colormap: Nom de la palette.
+    :param nodata: Valeur nodata du raster.
+    :return: Tableau RGBA uint8.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    valid = np.isfinite(image)
+    if nodata is not None:
+        valid &= image != nodata
+
+    # Plage constante (vmin == vmax, ex. raster uniforme) : tous les pixels valides à l'indice 0
+    with np.errstate(invalid="ignore"):
+        scaled = (np.clip(image, vmin, vmax) - vmin) * (255.0 / max(vmax - vmin, 1e-12))
+    index = np.where(valid, scaled, 0).astype(np.uint8)
+
+    rgba = get_lut(colormap)[index]
+    rgba[~valid] = 0
+    return rgba
+
+
+def png_bytes(rgba):
+    """
+    Compresse un tableau RGBA en PNG.
+    :param rgba: Tableau RGBA uint8.
+    :return: Contenu du fichier PNG.
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, mode="RGBA").save(buffer, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+def encode_png(rgba):
+    """
+    Encode un tableau RGBA en URL de données PNG.
+    :param rgba: Tableau RGBA uint8.
+    :return: URL "data:image/png;base64,...".
+    """
+    return f"data:image/png;base64,{base64.b64encode(png_bytes(rgba)).decode()}"
+
+
+@timed("raster_encode")
+def encode_overlay(image, vmin, vmax, colormap="blue", nodata=None):
+    """
+    Colore et encode une image pour folium.raster_layers.ImageOverlay.
+    :return: URL de données PNG.
+    """
+    return encode_png(colorize(image, vmin, vmax, colormap, nodata))
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _overlay_url(variable, day_offset, colormap, mtime):
+    raster = load_raster(variable, day_offset)
+    vmin, vmax = legend_range(variable)
+    return encode_overlay(raster.image, vmin, vmax, colormap, raster.nodata)
+
+
+def overlay_url(variable, day_offset, colormap="blue"):
+    """
+    URL PNG du raster d'une variable pour un jour, encodée une seule fois
+    par (variable, jour, palette) puis servie depuis le cache.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :param colormap: Nom de la palette.
+    :return: URL de données PNG.
+    """
+    return _overlay_url(variable, day_offset, colormap, os.path.getmtime(raster_path(variable, day_offset)))
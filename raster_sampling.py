@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from raster_access import DAY_OFFSETS, VARIABLE_CODES, load_raster
+
+# Libellé court de chaque variable pour les tableaux et graphiques
+VARIABLE_LABELS = {code: label for label, code in VARIABLE_CODES.items()}
+
+
+def pixel_indices(transform, width, height, latitudes, longitudes):
+    """
+    Convertit des coordonnées en indices de pixels, en bloc, par la transformation affine inverse.
+    :param transform: Transformation affine du raster.
+    :param width: Largeur du raster.
+    :param height: Hauteur du raster.
+    :param latitudes: Latitudes des points.
+    :param longitudes: Longitudes des points.
+    :return: Tuple (lignes, colonnes, masque des points à l'intérieur du raster).
+    """
+    cols, rows = ~transform * (np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float))
+    rows, cols = np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    return np.where(inside, rows, 0), np.where(inside, cols, 0), inside
+
+
+def sample_raster(raster, latitudes, longitudes):
+    """
+    Valeurs d'un raster aux points donnés, par indexation directe du tableau en cache.
+    :param raster: Raster (voir raster_access.load_raster).
+    :param latitudes: Latitudes des points.
+    :param longitudes: Longitudes des points.
+    :return: Tableau float des valeurs (NaN hors du raster ou sur nodata).
+    """
+    height, width = raster.image.shape
+    rows, cols, inside = pixel_indices(raster.transform, width, height, latitudes, longitudes)
+    values = raster.image[rows, cols].astype(float)
+    invalid = ~inside | ~np.isfinite(values)
+    if raster.nodata is not None:
+        invalid |= np.isclose(values, raster.nodata)
+    values[invalid] = np.nan
+    return values
+
+
+def sample_series(latitudes, longitudes, variables=tuple(VARIABLE_LABELS), day_offsets=DAY_OFFSETS):
+    """
+    Série de 7 jours des rasters climatiques pour un ou plusieurs points, en un seul appel.
+    Les rasters sont lus depuis le cache de raster_access : aucun fichier n'est rouvert.
+    :param latitudes: Latitude ou liste de latitudes.
+    :param longitudes: Longitude ou liste de longitudes.
+    :param variables: Codes des variables (prec, temp, hum).
+    :param day_offsets: Décalages des jours (-6 à 0).
+    :return: DataFrame (point, latitude, longitude, variable, jour, valeur), une ligne par point, variable et jour.
+    """
+    latitudes, longitudes = np.atleast_1d(latitudes).astype(float), np.atleast_1d(longitudes).astype(float)
+    points = np.arange(len(latitudes))
+    frames = []
+    for variable in variables:
+        for day_offset in day_offsets:
+            frames.append(pd.DataFrame({
+                "point": points,
+                "latitude": latitudes,
+                "longitude": longitudes,
+                "variable": VARIABLE_LABELS[variable],
+                "jour": day_offset,
+                "valeur": sample_raster(load_raster(variable, day_offset), latitudes, longitudes),
+            }))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,94 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+import streamlit as st
+
+from data_access import load_stations, station_version
+
+
+class StationIndex:
+    """
+    Index spatial des stations : géométries projetées dans un CRS métrique
+    (UTM estimé sur les données) et STRtree pour les requêtes de distance.
+    """
+
+    def __init__(self, gdf):
+        self.gdf = gdf
+        self.crs = gdf.estimate_utm_crs()
+        self.points = gdf.geometry.to_crs(self.crs).to_numpy()
+        self.tree = shapely.STRtree(self.points)
+
+    def project(self, geometry, crs="EPSG:4326"):
+        """
+        Projette une géométrie dans le CRS métrique de l'index.
+        :param geometry: Géométrie shapely.
+        :param crs: CRS de la géométrie.
+        :return: Géométrie projetée.
+        """
+        return gpd.GeoSeries([geometry], crs=crs).to_crs(self.crs).iloc[0]
+
+    def near(self, geometry, distance_km=0.0, crs="EPSG:4326"):
+        """
+        Stations situées à moins de distance_km d'un point ou d'un polygone.
+        :param geometry: Géométrie shapely (point ou polygone).
+        :param distance_km: Distance en kilomètres (0 : à l'intérieur du polygone).
+        :param crs: CRS de la géométrie.
+        :return: Masque booléen aligné sur le GeoDataFrame.
+        """
+        if distance_km <= 0 and shapely.get_dimensions(geometry) < 2:
+            # Sans distance, seul un polygone contient des stations
+            raise ValueError("Une distance positive est nécessaire autour d'un point ou d'une ligne.")
+        projected = self.project(geometry, crs)
+        if distance_km > 0:
+            hits = self.tree.query(projected, predicate="dwithin", distance=distance_km * 1000)
+        else:
+            hits = self.tree.query(projected, predicate="intersects")
+        mask = np.zeros(len(self.gdf), dtype=bool)
+        mask[hits] = True
+        return mask
+
+    def buffer_union(self, mask, distance_km):
+        """
+        Union des buffers métriques des stations sélectionnées.
+        :param mask: Masque booléen des stations.
+        :param distance_km: Rayon du buffer en kilomètres.
+        :return: Géométrie unique en EPSG:4326.
+        """
+        merged = shapely.union_all(shapely.buffer(self.points[mask], distance_km * 1000))
+        return gpd.GeoSeries([merged], crs=self.crs).to_crs("EPSG:4326").iloc[0]
+
+
+def attribute_mask(values, value=None, tolerance=0.0, min_value=None, max_value=None):
+    """
+    Filtre attributaire vectorisé : valeur à une tolérance près et/ou intervalle [min, max].
+    Avec plusieurs colonnes, une station est retenue si l'une d'elles correspond.
+    :param values: Series ou DataFrame des valeurs.
+    :param value: Valeur recherchée (ou None).
+    :param tolerance: Écart toléré autour de la valeur.
+    :param min_value: Borne minimale incluse (ou None).
+    :param max_value: Borne maximale incluse (ou None).
+    :return: Masque booléen.
+    """
+    array = np.asarray(values, dtype=float)
+    mask = np.ones(array.shape, dtype=bool)
+    if value is not None:
+        mask &= np.abs(array - value) <= tolerance
+    if min_value is not None:
+        mask &= array >= min_value
+    if max_value is not None:
+        mask &= array <= max_value
+    return mask.any(axis=1) if mask.ndim == 2 else mask
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _build_station_index(date, version):
+    return StationIndex(load_stations(date))
+
+
+def get_station_index(date=None):
+    """
+    Retourne l'index spatial des stations, construit une seule fois par date et par version des données.
+    :param date: Date des observations, ou None pour la plus récente.
+    :return: StationIndex.
+    """
+    return _build_station_index(*station_version(date))
@@ -0,0 +1,26 @@
+import numpy as np
+
+JOURS = ['J-6', 'J-5', 'J-4', 'J-3', 'J-2', 'J-1', 'J0']
+TITRE = "Évolution Temporelle de Température,Humidité et Précipitation"
+
+# Séries dans l'ordre du tableau (3, 7), avec les couleurs par défaut de matplotlib
+SERIES = [('Température (°c)', '#1f77b4'), ('Humidité (%)', '#ff7f0e'), ('Précipitations (mm)', '#2ca02c')]
+
+
+def chart_data(series):
+    """
+    Séries de toutes les stations pour add_point_layer(charts=...) : le graphique
+    d'une station est dessiné par le navigateur à l'ouverture de son popup, sans
+    aucun rendu côté serveur.
+    :param series: Tableau (stations, 3, 7) des valeurs température, humidité, précipitations de J-6 à J0.
+    :return: Dictionnaire sérialisable en JSON.
+    """
+    values = np.round(np.asarray(series, dtype=float), 1).astype(object)
+    values[values != values] = None  # NaN -> null
+    return {
+        "title": TITRE,
+        "labels": JOURS,
+        "names": [name for name, _ in SERIES],
+        "colors": [color for _, color in SERIES],
+        "values": values.tolist(),
+    }
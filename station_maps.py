@@ -0,0 +1,62 @@
+import folium
+
+from classification import classify
+from map_assets import add_plugins
+from map_layers import add_day_control, add_point_frames, add_point_layer
+from observations import VARIABLE_LABELS, day_label
+
+# Cartes des stations de la page 🗺️ Cartographie, partagées avec benchmarks.py
+# pour mesurer exactement ce que la page affiche
+
+
+def build_map(gdf, selected_column):
+    """
+    Construit la carte des valeurs moyennes (TEMPMOY, HUMIDITEMO) des stations.
+    :param gdf: GeoDataFrame des stations.
+    :param selected_column: Colonne à cartographier.
+    :return: Carte Folium.
+    """
+    # Création d'une carte centrée sur le Maroc
+    carte = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)
+
+    # Ajout de toutes les stations en une seule couche
+    values = gdf[selected_column].astype(float).to_numpy()
+    radii, fill_colors = classify(selected_column, values)
+    add_point_layer(carte, gdf, values=values, colors=fill_colors, radii=radii, label=selected_column)
+
+    # Plugins de la page (map_assets.PAGE_PLUGINS ou map_plugins.json)
+    add_plugins(carte, "cartographie")
+    return carte
+
+
+def build_days_map(gdf, observations, variable, day=0, animate=False):
+    """
+    Construit une carte basée sur les valeurs quotidiennes d'une variable.
+    :param gdf: GeoDataFrame contenant les données géospatiales.
+    :param observations: ObservationStore de la même date que les stations.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day: Jour affiché (ex. -3), au chargement si animate.
+    :param animate: Tous les jours dans la carte, changés par le navigateur.
+    :return: Carte Folium.
+    """
+    carte = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)
+
+    # Valeurs (stations, jours) dans l'ordre du GeoDataFrame, du jour le plus ancien à J0
+    days, values = observations.select(variable, stations=gdf["FID_1"])
+    labels = [f"{VARIABLE_LABELS[variable]} {day_label(d)}" for d in days]
+    start = list(days).index(day)
+
+    if animate:
+        # Tous les jours dans la même carte : le navigateur change de jour sans rerun
+        frames = []
+        for k, label in enumerate(labels):
+            radii, fill_colors = classify(variable, values[:, k])
+            frames.append({"values": values[:, k], "colors": fill_colors, "radii": radii, "label": label})
+        layer = add_point_frames(carte, gdf, frames, start=start)
+        add_day_control(carte, [layer], [day_label(d) for d in days], start=start)
+    else:
+        radii, fill_colors = classify(variable, values[:, start])
+        add_point_layer(carte, gdf, values=values[:, start], colors=fill_colors, radii=radii, label=labels[start])
+
+    add_plugins(carte, "cartographie")
+    return carte
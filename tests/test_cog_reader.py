@@ -0,0 +1,54 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+import cog_reader
+from cog_reader import read_cog, snap_bounds
+
+
+def write_cog(path, nodata=-3.4e38):
+    data = np.arange(64 * 64, dtype=np.float32).reshape(64, 64)
+    data[0, 0] = nodata
+    profile = dict(driver="GTiff", width=64, height=64, count=1, dtype="float32", crs="EPSG:4326",
+                   transform=from_origin(-10, 10, 0.25, 0.25), nodata=nodata,
+                   tiled=True, blockxsize=16, blockysize=16)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data, 1)
+    return data
+
+
+def test_snap_bounds_on_tile_grid():
+    step = 360 / 2 ** 5
+    snapped = snap_bounds((-7.1, 31.2, -6.9, 31.4), 5)
+    assert snapped == (-step, 2 * step, 0.0, 3 * step)
+    assert snap_bounds(snapped, 5) == snapped
+    assert snap_bounds((-7.1, 31.2, -6.9, 31.4), None) == (-7.1, 31.2, -6.9, 31.4)
+    assert snap_bounds(None, 5) is None
+
+
+def test_read_cog_window_and_nodata(tmp_path, monkeypatch):
+    monkeypatch.setattr(cog_reader, "BLOCK_CACHE_DIR", str(tmp_path / "blocks"))
+    path = str(tmp_path / "test.tif")
+    data = write_cog(path)
+    image, bounds, nodata = read_cog(path, bounds=(-10, 0, 0, 10))
+    assert nodata == np.float32(-3.4e38)
+    assert image.shape == (40, 40)
+    np.testing.assert_array_equal(image, data[:40, :40])
+    assert tuple(bounds) == (-10, 0, 0, 10)
+
+
+def test_block_cache_persists_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(cog_reader, "BLOCK_CACHE_DIR", str(tmp_path / "blocks"))
+    path = str(tmp_path / "test.tif")
+    data = write_cog(path)
+    cog_reader._block_cache.clear()
+    read_cog(path, bounds=(-10, 6, -6, 10))
+    assert len(list((tmp_path / "blocks").glob("*.npy"))) == 1
+
+    loaded = []
+    load_block = cog_reader._load_block
+    monkeypatch.setattr(cog_reader, "_load_block", lambda key: loaded.append(key) or load_block(key))
+    cog_reader._block_cache.clear()  # Nouveau processus : seul le disque reste
+    image, _, _ = read_cog(path, bounds=(-10, 6, -6, 10))
+    assert len(loaded) == 1
+    np.testing.assert_array_equal(image, data[:16, :16])
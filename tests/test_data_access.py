@@ -0,0 +1,70 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from shapely.geometry import Point
+
+from classification import CLASSIFICATIONS, classify
+from data_access import add_station_snapshot, available_dates, load_stations
+
+DATE = datetime.date(2023, 11, 22)
+
+
+def _write_stations(path, temperatures, humidities, date=DATE, regions=("Souss-Massa",)):
+    # Mêmes types que le fichier des stations : mesures en decimal128(19, 15)
+    count = len(temperatures)
+    table = pa.table({
+        "FID_1": pa.array(range(count), pa.int64()),
+        "Nom_Region": pa.array([regions[i % len(regions)] for i in range(count)]),
+        "TEMPMOY": pa.array([Decimal(value) for value in temperatures], pa.decimal128(19, 15)),
+        "HUMIDITEMO": pa.array([Decimal(value) for value in humidities], pa.decimal128(19, 15)),
+        "DATE": pa.array([date] * count, pa.date32()),
+        "geometry": pa.array(shapely.to_wkb([Point(-8 + i * 0.01, 30) for i in range(count)])),
+    })
+    pq.write_table(table, path)
+    return table
+
+
+def test_classify_unchanged_for_break_values(tmp_path):
+    # Valeurs égales aux seuils et juste autour : aucune ne doit changer de classe au chargement
+    temperatures = [str(value) for value in CLASSIFICATIONS["TEMPMOY"]["breaks"]] + ["19.399999999999999", "21.900000000000001"]
+    humidities = [str(value) for value in CLASSIFICATIONS["HUMIDITEMO"]["breaks"]] + ["40.6", "31.5"]
+    humidities = humidities[:len(temperatures)]
+    path = tmp_path / "stations.parquet"
+    table = _write_stations(path, temperatures, humidities)
+
+    gdf = load_stations(root=str(tmp_path / "absent"), path=str(path))
+    for column in ("TEMPMOY", "HUMIDITEMO"):
+        expected = np.array([float(value) for value in table[column].to_pylist()])
+        radii, colors = classify(column, expected)
+        loaded_radii, loaded_colors = classify(column, gdf[column].to_numpy())
+        assert gdf[column].dtype == np.float64
+        np.testing.assert_array_equal(loaded_colors, colors)
+        np.testing.assert_array_equal(loaded_radii, radii)
+
+
+def test_mixed_plain_and_region_snapshots(tmp_path):
+    # Une date sans partition de région, une date partitionnée par région
+    root = str(tmp_path / "stations")
+    by_region, plain = DATE, DATE + datetime.timedelta(days=1)
+    regions = ("Souss-Massa", "Oriental")
+    _write_stations(tmp_path / "plain.parquet", ["20"] * 4, ["30"] * 4, plain, regions)
+    _write_stations(tmp_path / "region.parquet", ["21"] * 4, ["31"] * 4, by_region, regions)
+    add_station_snapshot(str(tmp_path / "plain.parquet"), root)
+    add_station_snapshot(str(tmp_path / "region.parquet"), root, by_region=True)
+    assert available_dates(root) == [by_region, plain]
+
+    missing = str(tmp_path / "absent.parquet")
+    for date in (by_region, plain):
+        gdf = load_stations(date, root=root, path=missing)
+        assert len(gdf) == 4
+        assert sorted(gdf["Nom_Region"].astype(str).unique()) == sorted(regions)
+        assert (gdf["DATE"] == date).all()
+
+        oriental = load_stations(date, regions=["Oriental"], columns=["TEMPMOY", "DATE"], root=root, path=missing)
+        assert len(oriental) == 2
+        assert set(oriental.columns) == {"TEMPMOY", "DATE", "geometry"}
+        assert (oriental["DATE"] == date).all()
@@ -0,0 +1,36 @@
+import json
+
+import map_assets
+from map_assets import minify_css, vendor_assets
+
+CDN = "https://cdn.example.org/lib/1.0/"
+
+
+def test_vendor_assets_rewrites_css_and_prefers_min_js(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_assets, "asset_urls", lambda: [CDN + "lib.css", CDN + "lib.js", CDN + "other.js"])
+    files = {
+        CDN + "lib.css": b'/* commentaire */ .icon { background : url("images/icon.png") ; }',
+        CDN + "images/icon.png": b"PNG",
+        CDN + "lib.js": b"function  lib ( ) { }",
+        CDN + "lib.min.js": b"function lib(){}",
+        CDN + "other.js": b"var other;",
+    }
+
+    def fetch(url):
+        if url not in files:
+            raise OSError(url)
+        return files[url]
+
+    manifest = vendor_assets(str(tmp_path), fetch=fetch)
+    assert set(manifest) == {CDN + "lib.css", CDN + "images/icon.png", CDN + "lib.js", CDN + "other.js"}
+    assert not manifest[CDN + "images/icon.png"]["listed"]
+
+    css = (tmp_path / manifest[CDN + "lib.css"]["path"]).read_text()
+    assert css == f'.icon{{background:url("../{manifest[CDN + "images/icon.png"]["path"]}")}}'
+    assert (tmp_path / manifest[CDN + "lib.js"]["path"]).read_bytes() == b"function lib(){}"
+    assert (tmp_path / manifest[CDN + "other.js"]["path"]).read_bytes() == b"var other;"
+    assert json.loads((tmp_path / "manifest.json").read_text()) == manifest
+
+
+def test_minify_css_keeps_rules():
+    assert minify_css("a  >  b {\n  color : red ;\n}\n") == "a>b{color:red}"
@@ -0,0 +1,29 @@
+from map_layers import MapCache
+
+
+def test_map_cache_evicts_least_recently_used_by_bytes():
+    cache = MapCache(max_bytes=250, compress=False)
+    for key in ("a", "b"):
+        cache.put(key, key * 100)
+    cache.get("a")  # "a" devient la plus récente
+    cache.put("c", "c" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 100 and cache.get("c") == "c" * 100
+    assert cache.size == 200 and len(cache) == 2
+
+
+def test_map_cache_skips_entries_larger_than_budget():
+    cache = MapCache(max_bytes=50, compress=False)
+    cache.put("a", "a" * 10)
+    cache.put("b", "b" * 100)
+    assert cache.get("b") is None and cache.get("a") == "a" * 10
+
+
+def test_map_cache_compressed_round_trip():
+    cache = MapCache(max_bytes=1_000)
+    html = "<div>carte</div>" * 1_000
+    cache.put(("page", 1), html)
+    cache.put(("page", 1), html)  # Remplacement : la taille n'est comptée qu'une fois
+    assert cache.get(("page", 1)) == html
+    assert 0 < cache.size < len(html)
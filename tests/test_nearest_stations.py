@@ -0,0 +1,69 @@
+import io
+
+import geopandas as gpd
+import numpy as np
+import pytest
+
+from nearest_stations import EARTH_RADIUS_KM, NearestStations, parse_coordinates, read_coordinates_csv
+
+
+def _haversine(latitude, longitude, latitudes, longitudes):
+    lat1, lon1, lat2, lon2 = map(np.radians, (latitude, longitude, latitudes, longitudes))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _stations(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    gdf = gpd.GeoDataFrame(
+        {"FID_1": np.arange(n), "Nom_Region": rng.choice(["A", "B"], n)},
+        geometry=gpd.points_from_xy(rng.uniform(-17, -1, n), rng.uniform(21, 36, n)),
+        crs="EPSG:4326",
+    )
+    return gdf
+
+
+def test_query_matches_brute_force_haversine():
+    gdf = _stations()
+    index = NearestStations(gdf)
+    rng = np.random.default_rng(1)
+    latitudes, longitudes = rng.uniform(22, 35, 50), rng.uniform(-16, -2, 50)
+
+    distances, positions = index.query(latitudes, longitudes, k=5)
+    for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+        reference = _haversine(latitude, longitude, gdf.geometry.y.to_numpy(), gdf.geometry.x.to_numpy())
+        expected = np.argsort(reference)[:5]
+        np.testing.assert_array_equal(positions[i], expected)
+        np.testing.assert_allclose(distances[i], reference[expected], rtol=1e-9, atol=1e-6)
+
+
+def test_results_one_row_per_point_and_rank():
+    gdf = _stations(20)
+    results = NearestStations(gdf).results([30.0, 31.0], [-8.0, -7.0], k=3, columns=["Nom_Region"])
+    assert len(results) == 6
+    assert results["point"].tolist() == [0, 0, 0, 1, 1, 1]
+    assert results["rang"].tolist() == [1, 2, 3, 1, 2, 3]
+    assert (results.groupby("point")["distance_km"].diff().dropna() >= 0).all()
+    assert results["Nom_Region"].tolist() == gdf["Nom_Region"].iloc[results["position"]].tolist()
+
+
+def test_k_larger_than_stations():
+    distances, positions = NearestStations(_stations(2)).query([30.0], [-8.0], k=5)
+    assert distances.shape == positions.shape == (1, 2)
+
+
+def test_parse_coordinates():
+    latitudes, longitudes = parse_coordinates("33.5, -7.6\n\n 31.6;-8.0 \n")
+    np.testing.assert_array_equal(latitudes, [33.5, 31.6])
+    np.testing.assert_array_equal(longitudes, [-7.6, -8.0])
+    assert parse_coordinates("")[0].size == 0
+    with pytest.raises(ValueError):
+        parse_coordinates("33.5, abc")
+
+
+def test_read_coordinates_csv():
+    latitudes, longitudes = read_coordinates_csv(io.StringIO("nom,Lat,LON\nA,33.5,-7.6\nB,31.6,-8.0\n"))
+    np.testing.assert_array_equal(latitudes, [33.5, 31.6])
+    np.testing.assert_array_equal(longitudes, [-7.6, -8.0])
+    with pytest.raises(ValueError):
+        read_coordinates_csv(io.StringIO("x,y\n1,2\n"))
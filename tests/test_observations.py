@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from observations import WIDE_COLUMNS, ObservationStore, to_long_table
+
+
+def wide_stations():
+    df = pd.DataFrame({"FID_1": [30, 10, 20], "Nom_Region": ["A", "B", "A"]})
+    for offset, variable in enumerate(WIDE_COLUMNS):
+        for k, column in enumerate(WIDE_COLUMNS[variable]):
+            df[column] = np.arange(3) * 100 + offset * 10 + k
+    return df
+
+
+def test_select_day_in_station_order():
+    df = wide_stations()
+    store = ObservationStore(to_long_table(df))
+    days, values = store.select("prec", days=(-3, -3), stations=df["FID_1"])
+    assert days.tolist() == [-3]
+    assert values[:, 0].tolist() == df["PRECIPITJ_3"].tolist()
+
+
+def test_frame_matches_wide_columns():
+    df = wide_stations()
+    store = ObservationStore(to_long_table(df))
+    frame = store.frame([20, 20, 30], ["prec", "temp", "hum"])
+    assert frame.columns[:2].tolist() == ["Précipitation J0", "Précipitation J-1"]
+    assert frame.shape == (3, 21)
+    assert frame["Humidité J-6"].tolist() == df.set_index("FID_1").loc[[20, 20, 30], "HUMIDITEJ_6"].tolist()
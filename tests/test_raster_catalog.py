@@ -0,0 +1,44 @@
+import datetime
+import os
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+import raster_access
+import raster_catalog
+from raster_catalog import build_catalog
+
+
+def write_raster(path, data, nodata=-3.4e38):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[1], height=data.shape[0], count=1, dtype="float32",
+                       crs="EPSG:4326", transform=from_origin(-10, 30, 1, 1), nodata=nodata) as dst:
+        dst.write(data.astype(np.float32), 1)
+
+
+def test_build_catalog_describes_and_updates_only_changed(tmp_path, monkeypatch):
+    monkeypatch.setattr(raster_access, "RASTER_DIR", str(tmp_path))
+    monkeypatch.setattr(raster_catalog, "COG_DIR", str(tmp_path / "cog"))
+    monkeypatch.setattr(raster_catalog, "_base_date", lambda: datetime.date(2024, 1, 10))
+    data = np.arange(20, dtype=np.float32).reshape(4, 5)
+    data[0, 0] = -3.4e38
+    write_raster(tmp_path / "temp0.tif", data)
+    write_raster(tmp_path / "temp-1.tif", data + 1)
+    path = str(tmp_path / "catalog.json")
+
+    catalog = build_catalog(path)
+    assert sorted(catalog) == ["temp-1", "temp0"]
+    assert catalog["temp0"]["date"] == "2024-01-10" and catalog["temp-1"]["date"] == "2024-01-09"
+    assert (catalog["temp0"]["min"], catalog["temp0"]["max"]) == (1.0, 19.0)
+    assert catalog["temp0"]["bounds"] == [-10, 26, -5, 30]
+
+    described = []
+    describe = raster_catalog._describe
+    monkeypatch.setattr(raster_catalog, "_describe", lambda *args: described.append(args) or describe(*args))
+    assert build_catalog(path) == catalog
+    assert described == []
+
+    write_raster(tmp_path / "temp0.tif", np.where(data > 0, data * 2, data))
+    os.utime(tmp_path / "temp0.tif", (0, 0))
+    assert build_catalog(path)["temp0"]["max"] == 38.0
+    assert [args[:2] for args in described] == [("temp", 0)]
@@ -0,0 +1,46 @@
+import numpy as np
+import rasterio
+from rasterio.coords import BoundingBox
+from rasterio.transform import from_bounds
+
+from raster_access import Raster
+from raster_difference import difference_from_rasters, difference_range
+
+NODATA = -3.4028230607370965e+38
+BOUNDS = BoundingBox(-10.0, 30.0, -6.0, 32.0)
+
+
+def _raster(image):
+    image = np.asarray(image, dtype=np.float32)
+    height, width = image.shape
+    return Raster(image, BOUNDS, rasterio.crs.CRS.from_epsg(4326), from_bounds(*BOUNDS, width, height), NODATA)
+
+
+def test_difference_matches_elementwise_computation():
+    day_1 = np.array([[10, 20, NODATA, 4], [0, 5, 6, 8]])
+    day_2 = np.array([[5, 25, 3, 0], [0, 5, NODATA, 2]])
+    difference = difference_from_rasters(_raster(day_1), _raster(day_2), 0, -1)
+
+    # Pixels nodata d'un des deux jours : pas d'écart
+    expected = np.array([[5, -5, np.nan, 4], [0, 0, np.nan, 6]])
+    np.testing.assert_allclose(difference.delta, expected)
+    # Variation en % par rapport au deuxième jour, indéfinie si celui-ci vaut 0
+    np.testing.assert_allclose(difference.percent, [[100, -20, np.nan, np.nan], [np.nan, 0, np.nan, 300]])
+
+    assert difference.stats["pixels"] == 6
+    assert difference.stats["min"] == -5 and difference.stats["max"] == 6
+    np.testing.assert_allclose(difference.stats["mean"], 10 / 6)
+    assert difference.histogram["pixels"].sum() == 6
+
+
+def test_top_pixels_sorted_by_absolute_change():
+    difference = difference_from_rasters(_raster([[1, 9], [4, 0]]), _raster([[0, 1], [1, 6]]), 0, -3)
+    assert difference.top["écart"].tolist() == [8, -6, 3, 1]
+    # Coordonnées du centre du pixel (ligne 0, colonne 1)
+    assert (difference.top.loc[0, "latitude"], difference.top.loc[0, "longitude"]) == (31.5, -7.0)
+    assert difference.top.loc[0, "jour 0"] == 9 and difference.top.loc[0, "jour -3"] == 1
+
+
+def test_difference_range_is_symmetric_limit():
+    assert difference_range(np.array([np.nan, 0.0])) == 1.0
+    assert difference_range(np.linspace(-100, 100, 1001)) == np.percentile(np.abs(np.linspace(-100, 100, 1001)), 98)
@@ -0,0 +1,37 @@
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+from raster_overlay import colorize, encode_overlay, get_lut
+
+NODATA = -3.4028230607370965e+38
+
+
+def test_colorize_maps_range_onto_lut():
+    image = np.array([[0.0, 50.0, 100.0, 150.0, -10.0]])
+    rgba = colorize(image, 0, 100, "Reds")
+    lut = get_lut("Reds")
+    # Valeurs hors plage ramenées aux extrémités de la palette
+    np.testing.assert_array_equal(rgba[0], lut[[0, 127, 255, 255, 0]])
+
+
+def test_colorize_nodata_and_nan_transparent():
+    image = np.array([[NODATA, np.nan, 20.0]], dtype=np.float32)
+    rgba = colorize(image, 0, 100, "Greens", nodata=NODATA)
+    assert rgba[0, 0, 3] == rgba[0, 1, 3] == 0
+    assert rgba[0, 2, 3] == 255
+
+
+def test_encode_overlay_is_png_data_url():
+    url = encode_overlay(np.linspace(0, 100, 64).reshape(8, 8), 0, 100)
+    assert url.startswith("data:image/png;base64,")
+    image = Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+    assert image.size == (8, 8) and image.mode == "RGBA"
+
+
+def test_colorize_constant_range():
+    # Plage constante (vmin == vmax) : pas de division par zéro, indice 0 de la palette
+    rgba = colorize(np.array([[7.0, 7.0]]), 7, 7, "Reds")
+    np.testing.assert_array_equal(rgba[0], get_lut("Reds")[[0, 0]])
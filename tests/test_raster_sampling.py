@@ -0,0 +1,31 @@
+import numpy as np
+import rasterio
+from rasterio.coords import BoundingBox
+from rasterio.transform import from_bounds
+
+from raster_access import Raster
+from raster_sampling import sample_raster
+
+NODATA = -3.4028230607370965e+38
+
+
+def _raster():
+    # 4 x 5 pixels de 1° sur [-10, -5] x [30, 34], valeur = 10 * ligne + colonne
+    image = (np.arange(4)[:, None] * 10 + np.arange(5)[None, :]).astype(np.float32)
+    image[3, 4] = NODATA
+    bounds = BoundingBox(-10.0, 30.0, -5.0, 34.0)
+    return Raster(image, bounds, rasterio.crs.CRS.from_epsg(4326), from_bounds(*bounds, 5, 4), NODATA)
+
+
+def test_sample_matches_pixel_lookup():
+    raster = _raster()
+    latitudes = np.array([33.5, 33.99, 30.01, 31.5])
+    longitudes = np.array([-9.5, -5.01, -9.99, -7.5])
+    # Ligne 0 en haut (nord), colonne 0 à l'ouest
+    np.testing.assert_array_equal(sample_raster(raster, latitudes, longitudes), [0.0, 4.0, 30.0, 22.0])
+
+
+def test_sample_outside_or_nodata_is_nan():
+    raster = _raster()
+    values = sample_raster(raster, [35.0, 32.0, 30.5], [-7.5, -11.0, -5.5])
+    assert np.isnan(values).all()
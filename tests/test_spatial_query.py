@@ -0,0 +1,55 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Point, box
+
+from spatial_query import StationIndex, attribute_mask
+
+
+def _stations():
+    # Grille de 11 x 11 stations espacées de 0,1° autour de Marrakech
+    longitudes, latitudes = np.meshgrid(np.linspace(-8.5, -7.5, 11), np.linspace(31.1, 32.1, 11))
+    return gpd.GeoDataFrame(geometry=gpd.points_from_xy(longitudes.ravel(), latitudes.ravel()), crs="EPSG:4326")
+
+
+def test_near_point_matches_metric_distance():
+    gdf = _stations()
+    index = StationIndex(gdf)
+    center = Point(-8.0, 31.6)
+    mask = index.near(center, distance_km=25)
+
+    # Distances de référence calculées dans le même CRS métrique
+    distances = gdf.geometry.to_crs(index.crs).distance(index.project(center)).to_numpy()
+    np.testing.assert_array_equal(mask, distances <= 25_000)
+    assert 0 < mask.sum() < len(gdf)
+
+
+def test_near_polygon_without_distance_is_inside():
+    gdf = _stations()
+    mask = StationIndex(gdf).near(box(-8.25, 31.35, -7.75, 31.85))
+    inside = gdf.geometry.within(box(-8.25, 31.35, -7.75, 31.85)).to_numpy()
+    np.testing.assert_array_equal(mask, inside)
+
+
+@pytest.mark.parametrize("geometry", [Point(-8.0, 31.6), LineString([(-8.2, 31.4), (-7.8, 31.8)])])
+def test_near_point_or_line_requires_distance(geometry):
+    with pytest.raises(ValueError):
+        StationIndex(_stations()).near(geometry, distance_km=0)
+
+
+def test_buffer_union_covers_selected_stations():
+    gdf = _stations()
+    index = StationIndex(gdf)
+    mask = np.zeros(len(gdf), dtype=bool)
+    mask[[0, 60, 120]] = True
+    buffers = index.buffer_union(mask, 5)
+    assert all(buffers.contains(point) for point in gdf.geometry[mask])
+    assert not buffers.contains(gdf.geometry[1])
+
+
+def test_attribute_mask_value_interval_and_columns():
+    values = np.array([[0.0, 10.0], [5.0, 5.0], [np.nan, 20.0]])
+    np.testing.assert_array_equal(attribute_mask(values[:, 0], value=5, tolerance=0.5), [False, True, False])
+    np.testing.assert_array_equal(attribute_mask(values[:, 0], min_value=0, max_value=4), [True, False, False])
+    # Plusieurs colonnes : une station est retenue si l'une d'elles correspond
+    np.testing.assert_array_equal(attribute_mask(values, min_value=15), [False, False, True])
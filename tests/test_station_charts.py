@@ -0,0 +1,12 @@
+import numpy as np
+
+from station_charts import chart_data
+
+
+def test_chart_data_nan_to_null():
+    series = np.full((1, 3, 7), 1.26)
+    series[0, 2, 3] = np.nan
+    data = chart_data(series)
+    assert data["values"][0][2][3] is None
+    assert data["values"][0][0] == [1.3] * 7
+    assert len(data["names"]) == len(data["colors"]) == 3
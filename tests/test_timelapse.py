@@ -0,0 +1,18 @@
+import warnings
+
+import numpy as np
+
+from timelapse import render_frame
+
+
+def test_render_frame_masks_nodata_like_nan():
+    image = np.linspace(0, 30, 400, dtype=np.float32).reshape(20, 20)
+    with_nodata, with_nan = image.copy(), image.copy()
+    with_nodata[:5] = -3.4e38
+    with_nan[:5] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        frame = render_frame("Température", -1, with_nodata, (0, 0, 1, 1), nodata=np.float32(-3.4e38))
+        reference = render_frame("Température", -1, with_nan, (0, 0, 1, 1))
+    assert frame.dtype == np.uint8 and frame.shape[2] == 3
+    np.testing.assert_array_equal(frame, reference)
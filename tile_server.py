@@ -0,0 +1,297 @@
+import argparse
+import functools
+import mimetypes
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import folium
+import numpy as np
+import rasterio
+import streamlit as st
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject, transform_bounds
+
+from cog_convert import COG_DIR, cog_name
+from map_assets import ASSETS_DIR
+from map_layers import FrameLayer
+from metrics import REGISTRY, span
+from raster_access import RASTER_DIR, VARIABLE_CODES
+from raster_catalog import legend_range
+from raster_overlay import colorize, overlay_url, png_bytes
+
+# Serveur de tuiles XYZ (web mercator) pour les rasters de cliptemp/.
+# CLIMA_TILE_SERVER=1 active le mode tuiles sur les pages. Le serveur écoute sur
+# TILE_SERVER_HOST (127.0.0.1 : navigateur sur la même machine ; 0.0.0.0 pour
+# les autres postes). Le navigateur l'appelle sur l'hôte de la page Streamlit
+# (en-tête Host) et TILE_SERVER_PORT, ou sur TILE_SERVER_URL si elle est définie
+# (obligatoire derrière un proxy ou en HTTPS).
+TILES_ENABLED = os.environ.get("CLIMA_TILE_SERVER", "0") == "1"
+TILE_SERVER_HOST = os.environ.get("TILE_SERVER_HOST", "127.0.0.1")
+TILE_SERVER_PORT = int(os.environ.get("TILE_SERVER_PORT", "8765"))
+TILE_SERVER_URL = os.environ.get("TILE_SERVER_URL")
+
+TILE_SIZE = 256
+ORIGIN = 20037508.342789244
+TILE_PATH = re.compile(r"^/tiles/([a-z]+)/(-?\d+)/(\d+)/(\d+)/(\d+)\.png$")
+
+
+def source_path(variable, day_offset):
+    """
+    Fichier source d'une tuile : le COG généré par cog_convert s'il existe,
+    puis les COGs faits à la main, sinon le GeoTIFF.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :return: Chemin du fichier.
+    """
+    candidates = [
+        os.path.join(COG_DIR, cog_name(variable, day_offset)),
+        os.path.join(RASTER_DIR, cog_name(variable, day_offset)),
+        os.path.join(RASTER_DIR, f"{variable}{day_offset}cog.tif"),
+        os.path.join(RASTER_DIR, f"{variable}{day_offset}.tif"),
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Aucun raster pour {variable} {day_offset}")
+
+
+def tile_bounds(z, x, y):
+    """
+    Emprise d'une tuile XYZ en EPSG:3857.
+    :return: Tuple (left, bottom, right, top).
+    """
+    size = 2 * ORIGIN / 2 ** z
+    left = -ORIGIN + x * size
+    top = ORIGIN - y * size
+    return left, top - size, left + size, top
+
+
+def _overview_level(src, z):
+    """
+    Choisit l'aperçu le plus réduit dont la résolution reste plus fine que celle de la tuile.
+    :return: Indice de l'aperçu, ou None pour la pleine résolution.
+    """
+    tile_resolution = 2 * ORIGIN / 2 ** z / TILE_SIZE
+    source_resolution = src.res[0] * (111320 if src.crs.is_geographic else 1)
+    level = None
+    for index, factor in enumerate(src.overviews(1)):
+        if source_resolution * factor <= tile_resolution:
+            level = index
+    return level
+
+
+@functools.lru_cache(maxsize=4096)
+def _render_tile(path, mtime, z, x, y, colormap, vmin, vmax):
+    bounds = tile_bounds(z, x, y)
+    with rasterio.open(path) as src:
+        left, bottom, right, top = transform_bounds(src.crs, "EPSG:3857", *src.bounds)
+        if bounds[0] >= right or bounds[2] <= left or bounds[1] >= top or bounds[3] <= bottom:
+            return None
+        level = _overview_level(src, z)
+
+    tile = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+    open_options = {} if level is None else {"overview_level": level}
+    with rasterio.open(path, **open_options) as src:
+        reproject(
+            source=rasterio.band(src, 1),
+            destination=tile,
+            src_nodata=src.nodata,
+            dst_transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+            dst_crs="EPSG:3857",
+            dst_nodata=np.nan,
+            resampling=Resampling.bilinear,
+        )
+        # COG quantifié en int16 : retour aux valeurs physiques
+        tile = tile * src.scales[0] + src.offsets[0]
+    if np.isnan(tile).all():
+        return None
+    return png_bytes(colorize(tile, vmin, vmax, colormap))
+
+
+def render_tile(variable, day_offset, z, x, y, colormap="blue"):
+    """
+    Rend une tuile 256x256 colorée, mise en cache par fichier, version et position.
+    :return: Contenu PNG, ou None si la tuile est hors du raster.
+    """
+    path = source_path(variable, day_offset)
+    vmin, vmax = legend_range(variable)
+    with span("tile_render"):
+        return _render_tile(path, os.path.getmtime(path), z, x, y, colormap, vmin, vmax)
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """GET /tiles/{variable}/{day_offset}/{z}/{x}/{y}.png?colormap=blue, GET /metrics, GET /assets/{chemin}"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self.send_metrics()
+            return
+        if url.path.startswith("/assets/"):
+            self.send_asset(url.path[len("/assets/"):])
+            return
+        match = TILE_PATH.match(url.path)
+        if match is None or match.group(1) not in VARIABLE_CODES.values():
+            self.send_error(404)
+            return
+        variable, day_offset, z, x, y = match.group(1), *map(int, match.groups()[1:])
+        colormap = parse_qs(url.query).get("colormap", ["blue"])[0]
+        try:
+            content = render_tile(variable, day_offset, z, x, y, colormap)
+        except (FileNotFoundError, KeyError, ValueError):
+            self.send_error(404)
+            return
+
+        if content is None:
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_metrics(self):
+        # Mesures du processus (pages Streamlit et tuiles) au format Prometheus
+        content = REGISTRY.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_asset(self, path):
+        # Ressources Leaflet et plugins copiées par map_assets.py : les URL sont
+        # versionnées par le contenu (?v=...), d'où un cache navigateur d'un an
+        root = os.path.realpath(ASSETS_DIR)
+        path = os.path.realpath(os.path.join(root, path))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            content = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=TILE_SERVER_HOST, port=TILE_SERVER_PORT):
+    server = ThreadingHTTPServer((host, port), TileHandler)
+    server.daemon_threads = True
+    return server
+
+
+def public_url():
+    """
+    URL de base du serveur vue par le navigateur : TILE_SERVER_URL, sinon l'hôte
+    par lequel la page Streamlit a été ouverte, sur TILE_SERVER_PORT.
+    :return: URL sans / final.
+    """
+    if TILE_SERVER_URL:
+        return TILE_SERVER_URL.rstrip("/")
+    try:
+        host = st.context.headers.get("Host")
+    except Exception:
+        host = None  # Hors d'une session Streamlit (scripts, tests)
+    hostname = urlparse(f"//{host}").hostname if host else None
+    if not hostname:
+        hostname = "127.0.0.1"
+    elif ":" in hostname:
+        hostname = f"[{hostname}]"  # Adresse IPv6
+    return f"http://{hostname}:{TILE_SERVER_PORT}"
+
+
+@st.cache_resource(show_spinner=False)
+def _start_server():
+    try:
+        server = serve()
+    except OSError:
+        return  # Port déjà pris par un autre processus Streamlit : son serveur est réutilisé
+    threading.Thread(target=server.serve_forever, name="tile-server", daemon=True).start()
+
+
+def start_tile_server():
+    """
+    Démarre le serveur de tuiles dans un thread, une seule fois par processus.
+    Si le port est déjà pris (autre processus Streamlit), le serveur existant est réutilisé.
+    :return: URL de base du serveur vue par le navigateur (voir public_url).
+    """
+    _start_server()
+    return public_url()
+
+
+def add_raster_layer(carte, variable, day_offset, bounds, colormap="blue"):
+    """
+    Ajoute le raster d'une variable à la carte : couche de tuiles si le serveur
+    de tuiles est activé, sinon image PNG unique.
+    :param carte: Carte Folium.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offset: Décalage du jour (-6 à 0).
+    :param bounds: Emprise [[sud, ouest], [nord, est]] pour l'image unique.
+    :param colormap: Nom de la palette.
+    """
+    if not TILES_ENABLED:
+        folium.raster_layers.ImageOverlay(image=overlay_url(variable, day_offset, colormap), bounds=bounds, opacity=1).add_to(carte)
+        return
+
+    base_url = start_tile_server()
+    folium.TileLayer(
+        tiles=_tile_url(base_url, variable, day_offset, colormap),
+        attr="Morocco Clima",
+        name=f"{variable} {day_offset}",
+        overlay=True,
+        opacity=1,
+    ).add_to(carte)
+
+
+def _tile_url(base_url, variable, day_offset, colormap):
+    # La version du fichier dans l'URL invalide le cache du navigateur
+    version = int(os.path.getmtime(source_path(variable, day_offset)))
+    return f"{base_url}/tiles/{variable}/{day_offset}/{{z}}/{{x}}/{{y}}.png?colormap={colormap}&v={version}"
+
+
+def add_raster_frames(carte, variable, day_offsets, bounds, colormap="blue", start=-1):
+    """
+    Ajoute les rasters de plusieurs jours en une couche animée côté navigateur :
+    modèles d'URL de tuiles si le serveur de tuiles est activé, sinon une image
+    PNG par jour (encodée une seule fois par jour, voir overlay_url).
+    :param carte: Carte Folium.
+    :param variable: Code de la variable (prec, temp, hum).
+    :param day_offsets: Jours, dans l'ordre de lecture.
+    :param bounds: Emprise [[sud, ouest], [nord, est]] des images.
+    :param colormap: Nom de la palette.
+    :param start: Indice du jour affiché au chargement.
+    :return: La couche ajoutée (FrameLayer).
+    """
+    if not TILES_ENABLED:
+        urls = [overlay_url(variable, day_offset, colormap) for day_offset in day_offsets]
+        layer = FrameLayer(urls, bounds=bounds, start=start)
+    else:
+        base_url = start_tile_server()
+        urls = [_tile_url(base_url, variable, day_offset, colormap) for day_offset in day_offsets]
+        layer = FrameLayer(urls, attr="Morocco Clima", start=start)
+    layer.add_to(carte)
+    return layer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de tuiles XYZ des rasters climatiques")
+    parser.add_argument("--host", default=TILE_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=TILE_SERVER_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port).serve_forever()
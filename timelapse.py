@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import imageio.v3 as iio
+import numpy as np
+import streamlit as st
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from metrics import span
+from raster_access import DAY_OFFSETS, load_raster, raster_version, variable_code
+
+# Palette, plage et libellé de la barre de couleur par variable
+FRAME_STYLES = {
+    "prec": {"cmap": "Blues", "vmin": 1, "vmax": 100, "label": "Précipitation (mm)"},
+    "temp": {"cmap": "Reds", "vmin": 0, "vmax": 20, "label": "Température (°C)"},
+    "hum": {"cmap": "Greens", "vmin": 0, "vmax": 50, "label": "Humidité (%)"},
+}
+
+# Formats de sortie : extension et options d'encodage imageio
+FORMATS = {
+    "GIF": {"extension": ".gif", "mime": "image/gif", "options": {"duration": 1000, "loop": 0}},
+    "WebP": {"extension": ".webp", "mime": "image/webp", "options": {"duration": 1000, "loop": 0}},
+    "MP4": {"extension": ".mp4", "mime": "video/mp4", "options": {"fps": 1, "codec": "libx264"}},
+}
+
+
+def available_formats():
+    """
+    Formats utilisables dans cet environnement (MP4 nécessite imageio-ffmpeg).
+    :return: Liste des noms de formats.
+    """
+    try:
+        import imageio_ffmpeg  # noqa: F401
+    except ImportError:
+        return [name for name in FORMATS if name != "MP4"]
+    return list(FORMATS)
+
+
+def render_frame(column_type, day_offset, image, bounds, nodata=None):
+    """
+    Dessine une image du timelapse en mémoire (canvas Agg, sans fichier ni pyplot).
+    :param column_type: Libellé du type de donnée climatique.
+    :param day_offset: Décalage du jour (-6 à 0).
+    :param image: Tableau 2D du raster.
+    :param bounds: Emprise du raster (left, bottom, right, top).
+    :param nodata: Valeur nodata du raster (ou None), laissée transparente.
+    :return: Tableau RGB uint8 (hauteur, largeur, 3).
+    """
+    style = FRAME_STYLES[variable_code(column_type)]
+    fig = Figure(figsize=(10, 10))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    # Pixels nodata (ex. -3.4e38, -3 pour certains rasters de température) et non finis
+    # masqués, remplacés sous le masque pour que la normalisation ne déborde pas
+    mask = ~np.isfinite(image)
+    if nodata is not None:
+        mask |= image == nodata
+    image = np.ma.masked_array(np.where(mask, style["vmin"], image), mask=mask)
+    mappable = ax.imshow(image, extent=[bounds[0], bounds[2], bounds[1], bounds[3]], cmap=style["cmap"], vmin=style["vmin"], vmax=style["vmax"])
+    fig.colorbar(mappable, ax=ax, label=style["label"])
+    ax.set_title(f"{column_type} - Jour {day_offset}")
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+
+def _frame_inputs(column_type):
+    variable = variable_code(column_type)
+    inputs, errors = [], []
+    for day_offset in DAY_OFFSETS:
+        try:
+            raster = load_raster(variable, day_offset)
+            inputs.append((column_type, day_offset, np.array(raster.image), tuple(raster.bounds), raster.nodata))
+        except Exception as e:
+            errors.append((day_offset, str(e)))
+    return inputs, errors
+
+
+@st.cache_data(show_spinner=False, max_entries=12)
+def _build_timelapse(column_type, fmt, mtimes):
+    inputs, errors = _frame_inputs(column_type)
+    if not inputs:
+        return None, errors
+
+    # Rendu des images en parallèle sur plusieurs processus. Processus lancés par
+    # "spawn" : un fork du serveur Streamlit (multithread) peut copier un verrou tenu
+    # par un autre thread et bloquer l'enfant.
+    workers = min(len(inputs), os.cpu_count() or 1)
+    with span("timelapse_render"), ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        frames = list(executor.map(render_frame, *zip(*inputs)))
+
+    spec = FORMATS[fmt]
+    with span("timelapse_encode"):
+        content = iio.imwrite("<bytes>", np.stack(frames), extension=spec["extension"], **spec["options"])
+    return content, errors
+
+
+def build_timelapse(column_type, fmt="GIF"):
+    """
+    Construit le timelapse J-6 à J0 d'un type de donnée, encodé en mémoire.
+    Le résultat est mis en cache tant que les rasters ne changent pas.
+    :param column_type: Libellé du type de donnée climatique.
+    :param fmt: Format de sortie (GIF, WebP ou MP4).
+    :return: Tuple (contenu du fichier ou None, liste des erreurs (jour, message)).
+    """
+    variable = variable_code(column_type)
+    return _build_timelapse(column_type, fmt, raster_version(variable))
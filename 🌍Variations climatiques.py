@@ -1,9 +1,16 @@
 import streamlit as st
-from streamlit_folium import folium_static
 import folium
-import pandas as pd
-import rasterio
+from data_access import available_dates
+from raster_access import raster_version, variable_code
+from raster_catalog import legend_range, raster_bounds
+from tile_server import add_raster_layer
+from raster_difference import DIFFERENCE_COLORMAP, compute_difference, difference_overlay
 import branca.colormap as cm
+import plotly.express as px
+from matplotlib import colormaps
+from map_assets import add_plugins
+from map_layers import show_cached_map
+from metrics import page_rerun
 
 st.set_page_config(
     page_title="Morocco Clima\u2013MAPS",
@@ -46,97 +53,118 @@ with file_container:
     unsafe_allow_html=True,
 )
 
-def load_tif_image(column_type, day_offset):
-    column_mapping = {
-        "🌧 Précipitation": "prec",
-        "🌡️ Température": "temp",
-        "💧 Humidité": "hum"
-    }
+def build_day_map(column_type, day_offset, legend=False):
+    # Carte du raster d'un jour, avec la légende commune aux 7 jours si demandée
+    m = folium.Map(location=[31.7917, -7.0926], zoom_start=4.5, width='100%', height='80%')
+    add_plugins(m, "variations")
+    # Emprise du raster lue dans le catalogue, sans ouvrir le fichier
+    bounds = raster_bounds(variable_code(column_type), day_offset)
 
-    if column_type not in column_mapping:
-        raise ValueError(f"Le type de colonne {column_type} n'est pas pris en charge.")
+    # Ajuste les coordonnées pour encadrer la région du Maroc
+    bounds = [[bounds.bottom, bounds.left], [bounds.top, bounds.right]]
+
+    # Ajoute le raster à la carte Folium (tuiles ou image PNG)
+    add_raster_layer(m, variable_code(column_type), day_offset, bounds)
 
-    tif_path = f"cliptemp/{column_mapping[column_type]}{day_offset}.tif"
-    basemap = rasterio.open(tif_path)
+    if legend:
+        # Create a colormap legend with the min and max values from the raster catalog
+        vmin, vmax = legend_range(variable_code(column_type))
+        colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=vmin, vmax=vmax)
+        colormap.caption = f'Legend - Min: {vmin}, Max: {vmax} ({column_type})'
 
-    # Utilise la méthode read pour récupérer l'image
-    img = basemap.read(1)
+        # Add the legend to the map (positioned at the bottom-left)
+        colormap.add_to(m)
+        # Manually adjust the HTML to position the legend at the bottom-left
+        html = f'<div style="position: fixed; bottom: 10px; left: 10px; z-index:1000;">{colormap._repr_html_()}</div>'
+        m.get_root().html.add_child(folium.Element(html))
+    return m
 
-    return img, basemap.bounds
+def show_day_map(column_type, day_offset, legend=False):
+    # Carte rendue une seule fois par variable, jour et version des rasters : les couleurs
+    # et la légende viennent de legend_range, calculé sur les 7 jours
+    variable = variable_code(column_type)
+    key = ("variations", "jour", variable, day_offset, legend, raster_version(variable))
+    show_cached_map(key, lambda: build_day_map(column_type, day_offset, legend))
 
 def create_split_map(column_type, day_offset_1=0, day_offset_2=-1):
     day_1 = f'Jour {day_offset_1}' if day_offset_1 >= 0 else f'Jour {(day_offset_1)} '
     day_2 = f'Jour {day_offset_2}' if day_offset_2 >= 0 else f'Jour {(day_offset_2)} '
-    # Load the TIF image for the selected column type and day
-    basemap_image, bounds = load_tif_image(column_type, day_offset_2)
-    # Create two folium maps side by side
-    m1 = folium.Map(location=[31.7917, -7.0926], zoom_start=4.5, width='100%', height='80%')  
-    m2 = folium.Map(location=[31.7917, -7.0926], zoom_start=4.5, width='100%', height='80%')
-    folium.plugins.MousePosition().add_to(m2)
-    folium.plugins.MousePosition().add_to(m1)
-    # Load the TIF images for the selected column type and days
-    basemap_image_1, bounds_1 = load_tif_image(column_type, day_offset_1)
-    basemap_image_2, bounds_2 = load_tif_image(column_type, day_offset_2)
-
-    # Ajuste les coordonnées pour encadrer la région du Maroc
-    bounds_1 = [[bounds_1.bottom, bounds_1.left], [bounds_1.top, bounds_1.right]]
-    bounds_2 = [[bounds_2.bottom, bounds_2.left], [bounds_2.top, bounds_2.right]]
-
-    # Ajoute les images GeoTIFF à chaque carte Folium
-    image_overlay_1 = folium.raster_layers.ImageOverlay(image=basemap_image_1, bounds=bounds_1, opacity=1, colormap=lambda x: (0, 0, 1, x))
-    image_overlay_2 = folium.raster_layers.ImageOverlay(image=basemap_image_2, bounds=bounds_2, opacity=1, colormap=lambda x: (0, 0, 1, x))
 
-    # Ajoute les images aux cartes
-    image_overlay_1.add_to(m1)
-    image_overlay_2.add_to(m2)
-    
-    # Affiche les cartes utilisant Streamlit et folium_static
+    # Affiche les deux cartes côte à côte dans Streamlit
     col1, col2 = st.columns(2)
     with col1:
         st.header(day_1)
-        folium_static(m1)
+        show_day_map(column_type, day_offset_1)
 
     with col2:
         st.header(day_2)
-        folium_static(m2)
-        # Create a colormap legend with custom min and max values
-        if column_type == "🌧  Précipitation":
-            colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=100)
-            colormap.caption = f'Legend - Min: 0, Max: 100 ({column_type})'
-        elif column_type == "🌡️ Température":
-            colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=20)
-            colormap.caption = f'Legend - Min: 0, Max: 20 ({column_type})'
-        elif column_type == "💧 Humidité":
-            colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=50)
-            colormap.caption = f'Legend - Min: 0, Max: 50 ({column_type})'
-        else:
-            colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=basemap_image.min(), vmax=basemap_image.max())
-            colormap.caption = 'Legend'
-        
-        # Add the legend to the map (positioned at the bottom-left)
-        colormap.add_to(m2)
-        # Manually adjust the HTML to position the legend at the bottom-left
-        html = f'<div style="position: fixed; bottom: 10px; left: 10px; z-index:1000;">{colormap._repr_html_()}</div>'
-        m2.get_root().html.add_child(folium.Element(html))
+        show_day_map(column_type, day_offset_2, legend=True)
+
+def build_difference_map(column_type, day_offset_1=0, day_offset_2=-1, mode="delta"):
+    variable = variable_code(column_type)
+    difference = compute_difference(variable, day_offset_1, day_offset_2)
+    image_url, limit = difference_overlay(variable, day_offset_1, day_offset_2, mode)
+    unit = " (%)" if mode == "percent" else ""
+
+    # Une seule carte : écart jour 1 - jour 2 sur une palette divergente
+    m = folium.Map(location=[31.7917, -7.0926], zoom_start=4.5)
+    add_plugins(m, "variations")
+    bounds = difference.bounds
+    folium.raster_layers.ImageOverlay(image=image_url, bounds=[[bounds.bottom, bounds.left], [bounds.top, bounds.right]], opacity=1).add_to(m)
+
+    # Légende divergente centrée sur 0, mêmes couleurs que l'image
+    palette = colormaps[DIFFERENCE_COLORMAP]
+    colormap = cm.LinearColormap(colors=[palette(0.0), palette(0.5), palette(1.0)], index=[-limit, 0, limit], vmin=-limit, vmax=limit)
+    colormap.caption = f'Jour {day_offset_1} - Jour {day_offset_2}{unit} ({column_type})'
+    html = f'<div style="position: fixed; bottom: 10px; left: 10px; z-index:1000;">{colormap._repr_html_()}</div>'
+    m.get_root().html.add_child(folium.Element(html))
+    return m
+
+def create_difference_map(column_type, day_offset_1=0, day_offset_2=-1, mode="delta"):
+    variable = variable_code(column_type)
+    difference = compute_difference(variable, day_offset_1, day_offset_2)
+
+    # Carte rendue une seule fois par paire de jours, mode et version des 7 rasters de la variable
+    key = ("variations", "difference", variable, day_offset_1, day_offset_2, mode, raster_version(variable))
+    show_cached_map(key, lambda: build_difference_map(column_type, day_offset_1, day_offset_2, mode))
+
+    # Statistiques calculées avec l'écart
+    stats = difference.stats
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Écart moyen", f"{stats['mean']:.2f}")
+    col2.metric("Variation moyenne", f"{stats['mean_percent']:.1f} %")
+    col3.metric("Écart min / max", f"{stats['min']:.1f} / {stats['max']:.1f}")
+
+    fig = px.bar(difference.histogram, x="écart", y="pixels", title="Distribution des écarts", height=300)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("**Zones de plus forte variation**")
+    st.dataframe(difference.top.round(2), hide_index=True)
 
 def main():
     
     # Display a dropdown to select the column type (Précipitation, Temperature, Humidité)
-    df = pd.read_parquet(r"finalfinaaaaaaaaaal.parquet")
     st.sidebar.header('🌍 Variations climatiques')
     selected_column_type = st.sidebar.selectbox("Choisir le type de données climatiques", ["🌧 Précipitation", "🌡️ Température", "💧 Humidité"])
-    selected_date = df["DATE"].min()
+    selected_date = available_dates()[-1]
     # Utiliser st.date_input avec min_value et max_value pour bloquer la sélection
     st.sidebar.date_input(" 🗓️ Date disponible", value=selected_date, min_value=selected_date, max_value=selected_date)
     # Display the slider for choosing the day offsets
     day_offset_1 = st.sidebar.slider("Choisir le premier jour", min_value=-6, max_value=0, step=1, value=0, key="day_slider_1")
     day_offset_2 = st.sidebar.slider("Choisir le deuxième jour", min_value=-6, max_value=0, step=1, value=-1, key="day_slider_2")
 
-    create_split_map(selected_column_type, day_offset_1, day_offset_2)
+    # Mode d'affichage : deux cartes côte à côte ou carte des écarts
+    display_mode = st.sidebar.radio("Mode d'affichage", ["Côte à côte", "Différence"])
+    if display_mode == "Différence":
+        difference_mode = st.sidebar.radio("Afficher", ["Écart", "Variation (%)"])
+        create_difference_map(selected_column_type, day_offset_1, day_offset_2, "percent" if difference_mode == "Variation (%)" else "delta")
+    else:
+        create_split_map(selected_column_type, day_offset_1, day_offset_2)
     
 
 if __name__ == "__main__":
-    main()
+    with page_rerun("variations"):
+        main()
 # Variations_climatiques.py
 import streamlit as st
 
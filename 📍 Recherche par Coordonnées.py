@@ -1,9 +1,12 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
 import pandas as pd
 import geopandas as gpd
-from shapely.wkb import loads
+from nearest_stations import get_nearest_index, parse_coordinates, read_coordinates_csv
+from map_assets import add_plugins
+from map_layers import add_point_layer, show_map
+from observations import VARIABLE_LABELS, load_observations
+from metrics import page_rerun
 
 st.set_page_config(
     page_title="Morocco Clima\u2013MAPS",
@@ -33,71 +36,82 @@ st.markdown("""
         # Add horizontal line
 st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
-def create_map(gdf, search_coordinates=None):
+
+def create_map(gdf, results=None):
     # Création d'une carte centrée sur le Maroc
     carte = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)  # Augmentez le zoom_start
-    folium.plugins.MiniMap().add_to(carte)
-    folium.plugins.Fullscreen().add_to(carte)
-    folium.plugins.MousePosition().add_to(carte)
-    folium.plugins.Draw(export=True, draw_options={'rectangle': True}).add_to(carte)
-    folium.plugins.Geocoder().add_to(carte)
-    # Ajout des points sous forme de marqueurs
-    for index, row in gdf.iterrows():
-        try:
-            # Extraction des coordonnées à partir de la colonne 'geometry'
-            latitude, longitude = row['geometry'].y, row['geometry'].x
-
-            # Ajouter un point au cluster
-            folium.CircleMarker(location=[latitude, longitude], radius=1, color='blue', fill=True, fill_color='blue', fill_opacity=0.7,
-                                popup=f"Point {index}").add_to(carte)
-
-        except Exception as e:
-            st.warning(f"Une erreur s'est produite lors du traitement du point {index}: {e}")
-
-    # Si des coordonnées de recherche sont spécifiées, ajouter le point recherché avec un grand marqueur rouge
-    if search_coordinates:
-        try:
-            latitude, longitude = map(float, search_coordinates.split(','))
-            folium.Marker(location=[latitude, longitude], icon=folium.Icon(color='red', icon_size=(10, 10)),
-                          popup="Point recherché").add_to(carte)
-
-            # Zoom sur le point recherché
-            carte.fit_bounds([[latitude, longitude], [latitude, longitude]])
-
-        except ValueError:
-            st.error("Format de coordonnées invalide. Veuillez utiliser le format 'latitude, longitude'.")
-
-    # Affichage de la carte dans Streamlit
-    folium_static(carte)
-    # Ajouter le plugin Fullscreen
-    folium.plugins.Fullscreen().add_to(carte)
-
-    # Ajouter le plugin MousePosition
-    folium.plugins.MousePosition().add_to(carte)
+    add_plugins(carte, "recherche")
+
+    if results is None:
+        # Ajout des points en une seule couche
+        add_point_layer(carte, gdf, colors='blue', radii=1, weight=3, popups=[f"Point {index}" for index in gdf.index])
+    else:
+        # Seules les stations trouvées sont affichées
+        matched = gdf.iloc[results["position"].unique()]
+        popups = [f"Point {index}<br>Région: {region}" for index, region in zip(matched.index, matched["Nom_Region"])]
+        add_point_layer(carte, matched, colors='blue', radii=4, weight=3, popups=popups)
+
+        # Ajouter les points recherchés avec un marqueur rouge
+        queries = results.drop_duplicates("point")
+        if len(queries) <= 20:
+            for latitude, longitude in zip(queries["latitude"], queries["longitude"]):
+                folium.Marker(location=[latitude, longitude], icon=folium.Icon(color='red', icon_size=(10, 10)),
+                              popup="Point recherché").add_to(carte)
+        else:
+            query_points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(queries["longitude"], queries["latitude"]))
+            add_point_layer(carte, query_points, colors='red', stroke_color='red', radii=3, label="Point recherché")
 
-    # Ajouter le plugin Draw avec le mode rectangle activé
-    folium.plugins.Draw(export=True, draw_options={'rectangle': True}).add_to(carte)
+        # Zoom sur les points recherchés et leurs stations
+        carte.fit_bounds([
+            [min(queries["latitude"].min(), matched.geometry.y.min()), min(queries["longitude"].min(), matched.geometry.x.min())],
+            [max(queries["latitude"].max(), matched.geometry.y.max()), max(queries["longitude"].max(), matched.geometry.x.max())],
+        ])
 
-    folium.plugins.Geocoder().add_to(carte)
+    # Affichage de la carte dans Streamlit
+    show_map(carte)
 
 def main():
     
     
     
     try:
-        # Charger le fichier Parquet avec pandas et fastparquet
-        df = pd.read_parquet(r"datafin.parquet")
-
-        # Convertir les objets bytes en objets GeoPandas
-        df['geometry'] = df['geometry'].apply(lambda x: loads(x))
-        gdf = gpd.GeoDataFrame(df, geometry='geometry')
+        # Charger les stations et l'index des plus proches voisins depuis le cache partagé
+        index = get_nearest_index()
+        gdf = index.gdf
 
         # Ajout de la possibilité de chercher un point par ses coordonnées
         coordinates = st.text_input("Entrer les coordonnées du point (format: 'latitude, longitude')")
 
+        # Recherche groupée : liste collée ou fichier CSV
+        with st.expander("Rechercher plusieurs points"):
+            pasted_coordinates = st.text_area("Une paire 'latitude, longitude' par ligne")
+            uploaded_file = st.file_uploader("Ou un fichier CSV (colonnes latitude, longitude)", type=["csv"])
+
+        k = st.slider("Nombre de stations les plus proches", min_value=1, max_value=10, value=3)
+
         if st.button("Rechercher le point"):
-            # Création d'une nouvelle carte avec le point recherché
-            create_map(gdf, search_coordinates=coordinates)
+            try:
+                if uploaded_file is not None:
+                    latitudes, longitudes = read_coordinates_csv(uploaded_file)
+                elif pasted_coordinates.strip():
+                    latitudes, longitudes = parse_coordinates(pasted_coordinates)
+                else:
+                    latitudes, longitudes = parse_coordinates(coordinates)
+            except (ValueError, IndexError):
+                st.error("Format de coordonnées invalide. Veuillez utiliser le format 'latitude, longitude'.")
+                create_map(gdf)
+                return
+
+            if len(latitudes) == 0:
+                create_map(gdf)
+                return
+
+            # Les k stations les plus proches de chaque point et leurs valeurs J0 à J_6
+            results = index.results(latitudes, longitudes, k=k, columns=["Nom_Region"])
+            stations = gdf["FID_1"].to_numpy()[results["position"]]
+            results = pd.concat([results, load_observations().frame(stations, list(VARIABLE_LABELS))], axis=1)
+            create_map(gdf, results=results)
+            st.dataframe(results.drop(columns="position"), hide_index=True)
         else:
             # Création de la carte sans recherche
             create_map(gdf)
@@ -106,4 +120,5 @@ def main():
         st.error(f"Une erreur s'est produite : {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with page_rerun("recherche"):
+        main()
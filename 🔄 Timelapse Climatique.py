@@ -1,10 +1,6 @@
 import streamlit as st
-import os
-import imageio
-import pandas as pd
-import rasterio
-import matplotlib.pyplot as plt
-from matplotlib.colors import LogNorm
+from timelapse import FORMATS, available_formats, build_timelapse
+from metrics import page_rerun
 
 st.set_page_config(
     page_title="Dashboard GeoAnalytique",
@@ -36,75 +32,22 @@ st.markdown("""
 st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
 
-def load_tif_image(column_type, day_offset):
-    column_mapping = {
-        "Précipitation": "prec",
-        "Température": "temp",
-        "Humidité": "hum"
-    }
+def create_timelapse(column_type, fmt="GIF"):
+    # Création du timelapse en mémoire (mis en cache tant que les rasters ne changent pas)
+    content, errors = build_timelapse(column_type, fmt)
 
-    if column_type not in column_mapping:
-        raise ValueError(f"Le type de colonne {column_type} n'est pas pris en charge.")
+    for day_offset, error in errors:
+        st.warning(f"Une erreur s'est produite lors de la création de l'image pour le jour {day_offset}: {error}")
 
-    tif_path = f"cliptemp/{column_mapping[column_type]}{day_offset}.tif"
-    basemap = rasterio.open(tif_path)
+    if content is None:
+        return
 
-    # Utilise la méthode read pour récupérer l'image
-    img = basemap.read(1)
-
-    return img, basemap.bounds, basemap.crs
-
-def create_timelapse_gif(column_type, output_path):
-    # Création d'un fichier temporaire pour stocker les images
-    temp_folder = 'temp_images/'
-
-    # Création du dossier temporaire s'il n'existe pas
-    if not os.path.exists(temp_folder):
-        os.makedirs(temp_folder)
-
-    # Création du timelapse
-    images = []
-    for day_offset in range(-6, 1):
-        try:
-            # Load the TIF image for the selected column type and day
-            print(f"Loading image for {column_type} - Jour {day_offset}")
-            basemap_image, bounds, crs = load_tif_image(column_type, day_offset)
-
-            # Ajuste les coordonnées pour encadrer la région du Maroc
-            bounds = [[bounds.bottom, bounds.left], [bounds.top, bounds.right]]
-
-            # Create a Matplotlib plot
-            plt.figure(figsize=(10, 10))
-
-            if column_type == "Précipitation":
-                # Use LogNorm for better visualization of precipitation data
-                plt.imshow(basemap_image, extent=[bounds[0][1], bounds[1][1], bounds[0][0], bounds[1][0]], cmap='Blues', vmin=1, vmax=100)
-                plt.colorbar(label="Précipitation (mm)")
-            elif column_type == "Température":
-                plt.imshow(basemap_image, extent=[bounds[0][1], bounds[1][1], bounds[0][0], bounds[1][0]], cmap='Reds', vmin=0, vmax=20)
-                plt.colorbar(label="Température (°C)")
-            elif column_type == "Humidité":
-                plt.imshow(basemap_image, extent=[bounds[0][1], bounds[1][1], bounds[0][0], bounds[1][0]], cmap='Greens', vmin=0, vmax=50)
-                plt.colorbar(label="Humidité (%)")
-
-            plt.title(f"{column_type} - Jour {day_offset}")
-            plt.xlabel("Longitude")
-            plt.ylabel("Latitude")
-
-            # Save the Matplotlib plot as an image
-            temp_image_path = os.path.join(temp_folder, f'temp_image_{day_offset}.png')
-            plt.savefig(temp_image_path)
-            plt.close()
-            images.append(imageio.imread(temp_image_path))
-
-        except Exception as e:
-            st.warning(f"Une erreur s'est produite lors de la création de l'image pour le jour {day_offset}: {e}")
-
-    # Création du GIF avec imageio
-    imageio.mimsave(output_path, images, fps=1)
-
-    # Affichage du GIF
-    st.image(output_path, use_column_width=True)
+    # Affichage du timelapse
+    if FORMATS[fmt]["mime"].startswith("video/"):
+        st.video(content, format=FORMATS[fmt]["mime"])
+    else:
+        st.image(content, use_container_width=True)
+    st.download_button("Télécharger le timelapse", content, file_name=f"{column_type.lower()}_timelapse{FORMATS[fmt]['extension']}", mime=FORMATS[fmt]["mime"])
 
 def main():
     # Titre de l'application
@@ -114,11 +57,14 @@ def main():
         # Sélectionner le type de timelapse
         selected_timelapse = st.selectbox("Choisir le type de timelapse", ["Précipitation", "Température", "Humidité"])
 
+        selected_format = st.selectbox("Choisir le format", available_formats())
+
         if selected_timelapse in ["Précipitation", "Température", "Humidité"]:
-            create_timelapse_gif(selected_timelapse, output_path=f'{selected_timelapse.lower()}_timelapse.gif')
+            create_timelapse(selected_timelapse, selected_format)
 
     except Exception as e:
         st.error(f"Une erreur s'est produite : {e}")
 
 if __name__ == "__main__":
-    main()
+    with page_rerun("timelapse"):
+        main()
@@ -1,10 +1,16 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
-import pandas as pd
-import geopandas as gpd
-from shapely.wkb import loads
-from shapely.geometry import Point
+import json
+import hashlib
+import numpy as np
+from shapely.geometry import Point, shape
+from shapely.ops import unary_union
+from spatial_query import attribute_mask, get_station_index
+from data_access import available_dates, station_version
+from map_assets import add_plugins
+from map_layers import add_point_layer, show_cached_map
+from observations import day_label, load_observations
+from metrics import page_rerun
 
 st.set_page_config(
     page_title="Morocco Clima\u2013MAPS",
@@ -47,98 +53,110 @@ with file_container:
 )
 
 
-def create_map(gdf, buffer_radius):
+def build_map(index, mask, buffer_radius):
+    gdf = index.gdf[mask]
+
     # Création d'une carte centrée sur le Maroc
     carte = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)  # Augmentez le zoom_start
-    # Ajouter le plugin Fullscreen
-    folium.plugins.Fullscreen().add_to(carte)
-
-    # Ajouter le plugin MousePosition
-    folium.plugins.MousePosition().add_to(carte)
-
-    # Ajouter le plugin Draw avec le mode rectangle activé
-    folium.plugins.Draw(export=True, draw_options={'rectangle': True}).add_to(carte)
+    # Plugins de la page (map_assets.PAGE_PLUGINS ou map_plugins.json)
+    add_plugins(carte, "requetes")
 
-    folium.plugins.Geocoder().add_to(carte)
-
-    # Ajout des points sous forme de marqueurs
-    for idx, row in gdf.iterrows():
-        latitude, longitude = row['geometry'].y, row['geometry'].x
-
-        
-        # Créer le popup avec les valeurs de TEMP, HUMIDITE et DATE
-        popup_text = f" Date: {row['DATE']}\n Région: {row['Nom_Region']}\nTempératureMoyenne: {row['TEMPMOY']}\n Humidité Moyenne: {row['HUMIDITEMO']}"
+    # Créer les popups avec les valeurs de TEMP, HUMIDITE et DATE
+    popups = (" Date: " + gdf['DATE'].astype(str) + "<br> Région: " + gdf['Nom_Region'].astype(str)
+              + "<br>TempératureMoyenne: " + gdf['TEMPMOY'].astype(str) + "<br> Humidité Moyenne: " + gdf['HUMIDITEMO'].astype(str))
 
+    # Ajout des points en une seule couche
+    add_point_layer(carte, gdf, colors='blue', radii=5, popups=popups.tolist())
 
+    # Union des buffers calculés en mètres dans un CRS projeté, ajoutée en une seule couche
+    if buffer_radius > 0:
+        buffers = index.buffer_union(mask, buffer_radius)
+        folium.GeoJson(buffers.__geo_interface__, style_function=lambda x: {'fillColor': 'green', 'color': 'green'}).add_to(carte)
+    return carte
 
-        # Ajouter le marqueur avec le popup
-        folium.Marker(location=[latitude, longitude], popup=folium.Popup(popup_text, parse_html=True)).add_to(carte)
-
-        # Calculer la distance en kilomètres pour le rayon du buffer
-        buffer_radius_km = buffer_radius
-        buffer_point = row['geometry'].buffer(buffer_radius_km / 111.32)  # 1 degré de latitude ~ 111.32 km
-
-        # Ajouter le buffer à la carte
-        folium.GeoJson(buffer_point.__geo_interface__, style_function=lambda x: {'fillColor': 'green', 'color': 'green'}).add_to(carte)
-   
-    # Affichage de la carte dans Streamlit
-    folium_static(carte)
+def create_map(index, mask, buffer_radius, version=None):
+    # Affichage de la carte dans Streamlit : une même sélection de stations (quel que soit
+    # le filtre qui l'a produite) et un même rayon ne sont rendus qu'une seule fois
+    selection = hashlib.sha1(np.packbits(mask).tobytes()).hexdigest()
+    show_cached_map(("requetes", selection, buffer_radius, version), lambda: build_map(index, mask, buffer_radius))
 
 def main():
 
     try:
-        # Charger le fichier Parquet avec pandas et fastparquet
-        df = pd.read_parquet(r"finalfinaaaaaaaaaal.parquet")
+        # Choix de la date parmi l'historique des stations
+        dates = available_dates()
+        selected_date = st.date_input(" 🗓️ Date disponible", value=dates[-1], min_value=dates[0], max_value=dates[-1])
+        if selected_date not in dates:
+            st.warning("Aucune donnée de stations pour cette date.")
+            return
 
-        # Convertir les objets bytes en objets GeoPandas
-        df['geometry'] = df['geometry'].apply(lambda x: loads(x))
-        gdf = gpd.GeoDataFrame(df, geometry='geometry')
+        # Charger les stations de la date et leur index spatial depuis le cache partagé
+        index = get_station_index(selected_date)
+        gdf = index.gdf
 
        
         # Ajout de la possibilité de choisir une région
         selected_region = st.selectbox(':blue[Choisir une région]', gdf['Nom_Region'].unique())
 
         # Filtrer les points en fonction de la région choisie
-        filtered_gdf = gdf[gdf['Nom_Region'] == selected_region]
+        mask = (gdf['Nom_Region'] == selected_region).to_numpy(copy=True)
 
         # Ajout d'un texte pour spécifier le rayon du buffer
         buffer_radius = st.text_input(':blue[Entrer le rayon du buffer (en kilomètres)]', 0.0)
 
-        # Show the selectable columns based on the selected attribute
+        # Variable et jour filtrés, lus dans le magasin d'observations de la date
         selectable_columns = {
-            "🌧 Précipitation": ["PRECIPITATJ0", "PRECIPITJ_1", "PRECIPITJ_2", "PRECIPITJ_3", "PRECIPITJ_4", "PRECIPITJ_5", "PRECIPITJ_6"],
-            "🌡️ Température": ["TEMPERATURJ0", "TEMPERATJ_1", "TEMPERATJ_2", "TEMPERATJ_3", "TEMPERATJ_4", "TEMPERATJ_5", "TEMPERATJ_6"],
-            "💧 Humidité": ["HUMIDITEJ0", "HUMIDITEJ_1", "HUMIDITEJ_2", "HUMIDITEJ_3", "HUMIDITEJ_4", "HUMIDITEJ_5", "HUMIDITEJ_6"]
+            "🌧 Précipitation": "prec",
+            "🌡️ Température": "temp",
+            "💧 Humidité": "hum",
         }
         selected_attribute = st.selectbox(":blue[Sélectionner l'attribut]", list(selectable_columns.keys()))
-          # ":blue[Sélectionner le jour pour]"
-        # Show the selectable columns based on the selected attribute
-        selected_date = df["DATE"].min()
-        
-        # Utiliser st.date_input avec min_value et max_value pour bloquer la sélection
-        st.date_input(" 🗓️ Date disponible", value=selected_date, min_value=selected_date, max_value=selected_date)
-        selected_columns = selectable_columns[selected_attribute]
-        selected_column = st.selectbox(f":blue[Sélectionner le jour]", selected_columns, key=f"{selected_attribute}_column")
+        observations = load_observations(selected_date)
+        selected_day = st.selectbox(f":blue[Sélectionner le jour]", list(observations.days[::-1]), format_func=day_label,
+                                    key=f"{selected_attribute}_column")
 
         # Add text input boxes for attribute filters
-        attribute_filter = st.text_input(f":blue[Choisir une valeur de {selected_attribute}]", "0.0")
-
-        
+        filter_type = st.radio(":blue[Type de filtre]", ["Valeur (± tolérance)", "Intervalle [min, max]"], horizontal=True)
+        if filter_type == "Valeur (± tolérance)":
+            attribute_filter = st.text_input(f":blue[Choisir une valeur de {selected_attribute}]", "0.0")
+            tolerance = st.text_input(":blue[Tolérance]", "0.0")
+        else:
+            min_filter = st.text_input(f":blue[Valeur minimale de {selected_attribute}]", "")
+            max_filter = st.text_input(f":blue[Valeur maximale de {selected_attribute}]", "")
+
+        # Requête de proximité : stations à moins du rayon du buffer d'un point ou d'une zone
+        search_point = st.text_input(":blue[Stations proches d'un point (format: 'latitude, longitude')]", "")
+        search_zone = st.file_uploader(":blue[Stations dans une zone (GeoJSON exporté avec l'outil de dessin)]", type=["geojson", "json"])
 
         # Vérifier si le bouton a été cliqué pour rechercher un point
         if st.button("Rechercher le point"):
             # Parse the input values
-            attribute_value = float(attribute_filter) if attribute_filter else 0.0
+            buffer_radius = float(buffer_radius) if buffer_radius else 0.0
+            variable = selectable_columns[selected_attribute]
+            values = observations.select(variable, days=(selected_day, selected_day), stations=gdf["FID_1"])[1][:, 0]
 
             # Filter GeoDataFrame based on user inputs
-            if selected_column:
-                filtered_gdf = filtered_gdf[filtered_gdf[selected_column].eq(attribute_value)]
+            if filter_type == "Valeur (± tolérance)":
+                attribute_value = float(attribute_filter) if attribute_filter else 0.0
+                mask &= attribute_mask(values, value=attribute_value, tolerance=float(tolerance) if tolerance else 0.0)
             else:
-                filtered_gdf = filtered_gdf[filtered_gdf[selected_columns].eq(attribute_value).any(axis=1)]
+                mask &= attribute_mask(values, min_value=float(min_filter) if min_filter else None,
+                                       max_value=float(max_filter) if max_filter else None)
+
+            if search_point:
+                if buffer_radius <= 0:
+                    st.warning("Entrer un rayon de buffer supérieur à 0 pour rechercher les stations proches d'un point.")
+                    return
+                latitude, longitude = map(float, search_point.split(','))
+                mask &= index.near(Point(longitude, latitude), buffer_radius)
+            if search_zone is not None:
+                features = json.load(search_zone)
+                features = features.get("features", [features])
+                mask &= index.near(unary_union([shape(feature["geometry"]) for feature in features]), buffer_radius)
 
             # If the filtered GeoDataFrame is not empty, create and display the map
-            if not filtered_gdf.empty:
-                create_map(filtered_gdf, float(buffer_radius))
+            if mask.any():
+                create_map(index, mask, buffer_radius, station_version(selected_date))
             else:
                 st.warning("Aucun point ne correspond aux critères de filtre spécifiés.")
         
@@ -146,4 +164,5 @@ def main():
         st.error(f"Une erreur s'est produite : {e}")
 
 if __name__ == "__main__":
-    main()
+    with page_rerun("requetes"):
+        main()
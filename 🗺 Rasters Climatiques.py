@@ -1,10 +1,17 @@
 import streamlit as st
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
 import folium
-import rasterio
-import numpy as np
+from raster_access import variable_code
+from raster_catalog import legend_range, raster_bounds
+from tile_server import add_raster_frames, add_raster_layer
+from map_assets import add_plugins, localize_map
+from map_layers import add_day_control
+from raster_access import DAY_OFFSETS
 import branca.colormap as cm
-import pandas as pd
+import plotly.express as px
+from data_access import available_dates
+from raster_sampling import sample_series
+from metrics import page_rerun
 
 st.set_page_config(
     page_title="Morocco Clima\u2013MAPS",
@@ -37,64 +44,35 @@ st.markdown("""
 st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
 
-def load_tif_image(column_type, day_offset):
-    column_mapping = {
-        "🌧  Précipitation": "prec",
-        "🌡️ Température": "temp",
-        "💧 Humidité": "hum"
-    }
-    
-    if column_type not in column_mapping:
-        raise ValueError(f"Le type de colonne {column_type} n'est pas pris en charge.")
-
-    tif_path = f"cliptemp/{column_mapping[column_type]}{day_offset}.tif"
-    basemap = rasterio.open(tif_path)
-
-    # Utilise la méthode read pour récupérer l'image
-    img = basemap.read(1)
-    
-    return img, basemap.bounds
-
-def create_heatmap(column_type, day_offset=0):
+def create_heatmap(column_type, day_offset=0, animate=False):
     day = f'Jour {day_offset}' if day_offset >= 0 else f'Jour {abs(day_offset)} avant'
 
     # Create a folium map
     m = folium.Map(location=[29.985782, -8.668263], zoom_start=4.5)  # Coordonnées centrées sur le Maroc
 
-    # Ajouter le plugin Fullscreen
-    folium.plugins.Fullscreen().add_to(m)
+    # Plugins de la page (map_assets.PAGE_PLUGINS ou map_plugins.json)
+    add_plugins(m, "rasters")
 
-    # Ajouter le plugin MousePosition
-    folium.plugins.MousePosition().add_to(m)
+    if animate:
+        # Les 7 jours dans la même carte : le navigateur change de jour sans rerun
+        bounds = [raster_bounds(variable_code(column_type), offset) for offset in DAY_OFFSETS]
+        bounds = [[[b.bottom, b.left], [b.top, b.right]] for b in bounds]
+        layer = add_raster_frames(m, variable_code(column_type), DAY_OFFSETS, bounds, start=DAY_OFFSETS.index(day_offset))
+        add_day_control(m, [layer], [f"Jour {offset}" for offset in DAY_OFFSETS], start=DAY_OFFSETS.index(day_offset))
+    else:
+        # Emprise du raster lue dans le catalogue, sans ouvrir le fichier
+        bounds = raster_bounds(variable_code(column_type), day_offset)
 
-    # Ajouter le plugin Draw avec le mode rectangle activé
-    folium.plugins.Draw(export=True, draw_options={'rectangle': True}).add_to(m)
-    folium.plugins.MiniMap().add_to(m)
-    
+        # Ajuste les coordonnées pour encadrer la région du Maroc
+        bounds = [[bounds.bottom, bounds.left], [bounds.top, bounds.right]]
 
-    # Load the TIF image for the selected column type and day
-    basemap_image, bounds = load_tif_image(column_type, day_offset)
-
-    # Ajuste les coordonnées pour encadrer la région du Maroc
-    bounds = [[bounds.bottom, bounds.left], [bounds.top, bounds.right]]
-
-    # Ajoute l'image GeoTIFF à la carte Folium en utilisant la colormap viridis
-    image_overlay = folium.raster_layers.ImageOverlay(image=basemap_image, bounds=bounds, opacity=1, colormap=lambda x: (0, 0, 1, x))
-    image_overlay.add_to(m)
-
-    # Create a colormap legend with custom min and max values
-    if column_type == "🌧  Précipitation":
-        colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=100)
-        colormap.caption = f'Legend - Min: 0, Max: 100 ({column_type})'
-    elif column_type == "🌡️ Température":
-        colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=20)
-        colormap.caption = f'Legend - Min: 0, Max: 20 ({column_type})'
-    elif column_type == "💧 Humidité":
-        colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=0, vmax=50)
-        colormap.caption = f'Legend - Min: 0, Max: 50 ({column_type})'
-    else:
-        colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=basemap_image.min(), vmax=basemap_image.max())
-        colormap.caption = 'Legend'
+        # Ajoute le raster à la carte Folium (tuiles ou image PNG encodée une seule fois)
+        add_raster_layer(m, variable_code(column_type), day_offset, bounds)
+
+    # Create a colormap legend with the min and max values from the raster catalog
+    vmin, vmax = legend_range(variable_code(column_type))
+    colormap = cm.LinearColormap(colors=['white', 'blue'], vmin=vmin, vmax=vmax)
+    colormap.caption = f'Legend - Min: {vmin}, Max: {vmax} ({column_type})'
     
     # Add the legend to the map (positioned at the bottom-left)
     colormap.add_to(m)
@@ -104,27 +82,54 @@ def create_heatmap(column_type, day_offset=0):
     html = f'<div style="position: fixed; bottom: 10px; left: 10px; z-index:1000;">{colormap._repr_html_()}</div>'
     m.get_root().html.add_child(folium.Element(html))
 
-    # Affiche la carte utilisant Streamlit et folium_static
-    folium_static(m)
-   
+    # Ressources locales si elles ont été copiées, puis affichage et dernier point cliqué
+    localize_map(m)
+    output = st_folium(m, key="raster_map", width=700, height=500, returned_objects=["last_clicked"])
+    return output.get("last_clicked") if output else None
+
+
+def show_point_series(point):
+    """
+    Affiche la série J-6 à J0 des trois rasters au point cliqué sur la carte.
+    :param point: Dictionnaire {"lat": ..., "lng": ...} renvoyé par la carte.
+    """
+    series = sample_series(point["lat"], point["lng"])
+    st.markdown(f"**Série au point ({point['lat']:.4f}, {point['lng']:.4f})**")
+    if series["valeur"].isna().all():
+        st.info("Le point cliqué est en dehors des rasters.")
+        return
+    fig = px.line(series, x="jour", y="valeur", facet_row="variable", markers=True, height=600)
+    fig.update_yaxes(matches=None, title_text="")
+    fig.for_each_annotation(lambda annotation: annotation.update(text=annotation.text.split("=")[-1]))
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(series.pivot(index="jour", columns="variable", values="valeur"))
+
 
 def main():
   
-    df = pd.read_parquet(r"finalfinaaaaaaaaaal.parquet")
     st.sidebar.header('🗺  Rasters Climatiques ')
     # Display a dropdown to select the column type (Précipitation, Temperature, Humidité)
     selected_column_type = st.sidebar.selectbox("Choisir l'attribut :", ["🌧  Précipitation", "🌡️ Température", "💧 Humidité"])
 
-        # Utiliser la première date dans la colonne "DATE" comme date fixe
-    selected_date = df["DATE"].min()
+        # Date des rasters : la plus récente des stations, lue sans charger de lignes
+    selected_date = available_dates()[-1]
     # Sidebar
     
     # Utiliser st.date_input avec min_value et max_value pour bloquer la sélection
     st.sidebar.date_input("🗓️ La date disponible :", value=selected_date, min_value=selected_date, max_value=selected_date)
-    # Display the slider for choosing the day offset
-    day_offset = st.sidebar.slider("Choisir le jour: J-6 au J0", min_value=-6, max_value=0, step=1, value=0, key="day_slider")
-
-    create_heatmap(selected_column_type, day_offset)
+    # Animation dans le navigateur (aucun rerun au changement de jour) ou choix du jour par le curseur
+    animate = st.sidebar.toggle("Animation J-6 à J0 dans la carte", value=True)
+    day_offset = 0
+    if not animate:
+        # Display the slider for choosing the day offset
+        day_offset = st.sidebar.slider("Choisir le jour: J-6 au J0", min_value=-6, max_value=0, step=1, value=0, key="day_slider")
+
+    clicked = create_heatmap(selected_column_type, day_offset, animate)
+    if clicked:
+        show_point_series(clicked)
+    else:
+        st.caption("Cliquer sur la carte pour afficher la série J-6 à J0 en ce point.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with page_rerun("rasters"):
+        main()
\ No newline at end of file